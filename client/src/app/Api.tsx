@@ -219,7 +219,7 @@ export async function putReaction(token, reaction_type, post_id) {
     });
 }
 
-export async function fetchPosts(user_id = null, last_timestamp = null, limit = 10) {
+export async function fetchPosts(user_id = null, last_timestamp = null, limit = 10, token = null) {
   await servicesWait();
 
   const params = {
@@ -227,9 +227,10 @@ export async function fetchPosts(user_id = null, last_timestamp = null, limit =
     ...(user_id && { user_id }),
     ...(last_timestamp && { last_timestamp }),
   };
+  const headers = token ? { Authorization: `Bearer ${token}` } : {};
 
   try {
-    const response = await apiClient.get(`${services.controller.url}/post`, { params });
+    const response = await apiClient.get(`${services.controller.url}/post`, { params, headers });
     return response.data.posts;
   } catch (error) {
     console.error("Error fetching posts:", error.response?.data || error.message);
@@ -340,11 +341,11 @@ export async function fetchUserByUsername(username) {
     });
 }
 
-export async function searchRequestedResults(query: string, type: string) {
+export async function searchRequestedResults(query: string, type: string, cursor?: string) {
   await servicesWait();
   return apiClient
     .get(`${services.controller.url}/post/search`, {
-      params: { query, type},
+      params: { query, type, ...(cursor && { cursor }) },
     })
     .then((response) => {
       return response.data;
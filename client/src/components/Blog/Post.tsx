@@ -12,7 +12,6 @@ import { SiDatadog } from "react-icons/si";
 import ImageSlider from "../ImageSlider";
 import { ImageOff } from 'lucide-react';
 import useToken from "../contexts/TokenContext";
-import useUser from "../contexts/UserContext";
 
 const reactionsArray = [
   {"type": "good", "text": "Good", "count": 0}, 
@@ -23,32 +22,25 @@ const reactionsArray = [
   {"type": "cry", "text": "Sad", "count": 0}
 ];
 
-const updateReactionsCount = (reactions) => {
-  const counts = reactions.reduce((acc, reaction) => {
-    acc[reaction.reaction_type] = (acc[reaction.reaction_type] || 0) + 1;
-    return acc;
-  }, {});
-
+const updateReactionsCount = (reactionsCount) => {
   return reactionsArray.map((reaction) => ({
     ...reaction,
-    count: counts[reaction.type] || 0,
+    count: reactionsCount[reaction.type] || 0,
   }));
 };
 
 const Post = ({ post, index, handleAnimations }: { post: Post, index: Number, handleAnimations: CallableFunction }) => {
-  const { id, content, images, user, location, timestamp, reactions } = post;
+  const { id, content, images, user, location, timestamp, reactions_count, user_reaction } = post;
   const [selectedReactionNum, setSelectedReactionNum] = useState<number | null>(null);
   const [reactionsCounts, setReactionsCounts] = useState(reactionsArray);
   const { token } = useToken();
-  const { userSelf } = useUser();
 
   useEffect(() => {
-    if (token && reactions) {
-      const updatedReactions = updateReactionsCount(reactions); 
-      const userReactionType = reactions.find((reaction) => reaction.user_id === userSelf?.id)?.reaction_type;
+    if (token && reactions_count) {
+      const updatedReactions = updateReactionsCount(reactions_count); 
 
-      if (userReactionType) {
-        const userReactionIndex = updatedReactions.findIndex((reaction) => reaction.type === userReactionType);
+      if (user_reaction) {
+        const userReactionIndex = updatedReactions.findIndex((reaction) => reaction.type === user_reaction);
 
         if (userReactionIndex !== -1) {
           updatedReactions[userReactionIndex].count -= 1;
@@ -59,7 +51,7 @@ const Post = ({ post, index, handleAnimations }: { post: Post, index: Number, ha
       }
 
       setReactionsCounts(updatedReactions);
-  }}, [token, reactions]);
+  }}, [token, reactions_count, user_reaction]);
 
   const changeReaction = (reactionNum) => {
     if (reactionNum === selectedReactionNum) {
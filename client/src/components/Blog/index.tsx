@@ -28,7 +28,7 @@ const Blog = () => {
 
   const fetchPostsFunc = () => {
     setIsLoading(true);
-    fetchPosts(null, lastTimestamp, 6).then((data) => {
+    fetchPosts(null, lastTimestamp, 6, token).then((data) => {
       if (data.length !== 0) {
         setPostData((prev) => prev.concat(data));
         setLastTimestamp(data.at(-1).timestamp);
@@ -46,7 +46,7 @@ const Blog = () => {
   useEffect(() => {
     if (token) {
       setIsLoading(true);
-      fetchPosts(null, lastTimestamp, 6).then((data) => {
+      fetchPosts(null, lastTimestamp, 6, token).then((data) => {
         if (data.length !== 0) {
           setPostData(data);
           setLastTimestamp(data.at(-1).timestamp);
@@ -39,7 +39,7 @@ const Profile = () => {
     if (!userData?.id || !hasMorePosts || loadingPosts) return;
 
     setLoadingPosts(true);
-    fetchPosts(userData.id, lastFetchedTimestamp)
+    fetchPosts(userData.id, lastFetchedTimestamp, 10, token)
       .then((posts) => {
         if (posts.length > 0) {
           setUserPosts((prevPosts) => [...prevPosts, ...posts]);
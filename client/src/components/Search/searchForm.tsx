@@ -27,6 +27,8 @@ const SearchPage = () => {
   const [allPosts, setAllPosts] = useState<any[]>([]);
   const [displayedPosts, setDisplayedPosts] = useState<any[]>([]);
   const [hasMorePosts, setHasMorePosts] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [postsQuery, setPostsQuery] = useState("");
   const [loadingPosts, setLoadingPosts] = useState(false);
 
   const fadeTimeout = useRef<NodeJS.Timeout | null>(null);
@@ -52,6 +54,7 @@ const SearchPage = () => {
     setAllPosts([]);
     setDisplayedPosts([]);
     setHasMorePosts(false);
+    setNextCursor(null);
 
     try {
       const data = await searchRequestedResults(searchQuery, searchType);
@@ -63,8 +66,10 @@ const SearchPage = () => {
         const posts = data.posts || [];
         setAllPosts(posts);
         setDisplayedPosts(posts.slice(0, 3));
-        setHasMorePosts(posts.length > 3);
-        setSuccessMessage(`Found ${posts.length} posts`);
+        setNextCursor(data.next_cursor || null);
+        setPostsQuery(searchQuery);
+        setHasMorePosts(posts.length > 3 || !!data.next_cursor);
+        setSuccessMessage(`Found ${posts.length}${data.next_cursor ? "+" : ""} posts`);
       }
 
       setShowMessage(true);
@@ -76,15 +81,30 @@ const SearchPage = () => {
     }
   };
 
-  const loadMorePosts = () => {
+  const loadMorePosts = async () => {
     setLoadingPosts(true);
-    setTimeout(() => {
-      const currentLength = displayedPosts.length;
-      const newPosts = allPosts.slice(currentLength, currentLength + 3);
-      setDisplayedPosts([...displayedPosts, ...newPosts]);
-      setHasMorePosts(currentLength + 3 < allPosts.length);
-      setLoadingPosts(false);
-    }, 500);
+    const currentLength = displayedPosts.length;
+    let posts = allPosts;
+    let cursor = nextCursor;
+
+    // the server returns search results page by page, fetch the next one when the loaded posts run out
+    if (currentLength + 3 > posts.length && cursor) {
+      try {
+        const data = await searchRequestedResults(postsQuery, "content", cursor);
+        posts = [...posts, ...(data.posts || [])];
+        cursor = data.next_cursor || null;
+      } catch (error) {
+        setError(`Loading more posts failed: ${error instanceof Error ? error.message : "Unknown error"}`);
+        setShowMessage(true);
+        fadeCycle();
+      }
+      setAllPosts(posts);
+      setNextCursor(cursor);
+    }
+
+    setDisplayedPosts(posts.slice(0, currentLength + 3));
+    setHasMorePosts(currentLength + 3 < posts.length || !!cursor);
+    setLoadingPosts(false);
   };
 
   return (
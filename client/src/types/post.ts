@@ -1,6 +1,5 @@
 import { User } from "./user";
 import { Comment } from "./comment";
-import { Reaction } from "./reaction";
 
 export type Post = {
   id: string;
@@ -9,5 +8,6 @@ export type Post = {
   user: User;
   location: string;
   timestamp: string;
-  reactions: Array<Reaction>;
+  reactions_count: Record<string, number>;
+  user_reaction: string | null;
 };
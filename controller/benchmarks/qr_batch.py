@@ -0,0 +1,61 @@
+'''
+Throughput of bulk QR tag generation in codes per second: rendering one code
+after another against `render_codes` on a process pool of `--workers` (one per
+CPU by default, used only with `qr.batch_workers: 0`, otherwise the application
+has started its own pool), and the whole streamed PDF and ZIP outputs of
+`/qr/batch`. The cache is bypassed, every code is rendered.
+
+Run inside the controller container:
+
+    python -m benchmarks.qr_batch [--codes 500] [--workers 4] [--error-correction M]
+'''
+import os
+import time
+import argparse
+from typing import Callable, Iterator
+
+from bson.objectid import ObjectId
+
+from src.utils.qr import QrOptions, profile_url, render_qr
+from src.utils.qr_batch import page_count, render_codes, sheet_pages, start_pool, stream_pdf, stream_zip
+
+
+def measure(run: Callable[[], Iterator]) -> tuple[float, int]:
+    '''
+    Seconds to exhaust the iterator of `run` and the bytes it produced.
+    '''
+    started = time.perf_counter()
+    size = sum(len(item[1]) if isinstance(item, tuple) else len(item) for item in run())
+    return time.perf_counter() - started, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark bulk QR code generation')
+    parser.add_argument('--codes', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--error-correction', default='M')
+    args = parser.parse_args()
+
+    user_ids = [str(ObjectId()) for _ in range(args.codes)]
+    labels = {user_id: f'pet-{index}' for index, user_id in enumerate(user_ids)}
+    options = QrOptions(error_correction=args.error_correction)
+
+    start_pool(args.workers)
+
+    runs = {
+        'serial': lambda: ((user_id, render_qr(profile_url(user_id), options)) for user_id in user_ids),
+        f'pool of {args.workers}': lambda: render_codes(user_ids, options, cache=False),
+        'pool + zip': lambda: stream_zip(
+            (f'{user_id}.png', content) for user_id, content in render_codes(user_ids, options, cache=False)
+        ),
+        'pool + pdf': lambda: stream_pdf(
+            sheet_pages(render_codes(user_ids, options, cache=False), labels), page_count(len(user_ids))
+        ),
+    }
+    for name, run in runs.items():
+        seconds, size = measure(run)
+        print(f'{name:>15}: {args.codes / seconds:8.1f} codes/s {size / 2 ** 20:8.2f} MiB')
+
+
+if __name__ == '__main__':
+    main()
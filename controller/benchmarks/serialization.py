@@ -0,0 +1,56 @@
+'''
+Per-post serialisation cost of the feed response: flask-restx `marshal` + json
+against the compiled encoder + orjson from `src.utils.serializer`.
+
+Run inside the controller container:
+
+    python -m benchmarks.serialization [--posts 50] [--repeat 200]
+'''
+import json
+import timeit
+import argparse
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from flask_restx import marshal
+
+from src.endpoints.post import post_list_model
+from src.database.queries import REACTION_TYPES
+from src.utils.serializer import compile_model, encode
+
+
+def sample_post(index: int) -> dict:
+    return {
+        'id': str(ObjectId()),
+        'content': f'Walk in the park #{index}',
+        'images': ['https://i.imgur.com/IszRpNP.jpeg', 'https://i.imgur.com/mGjZUFQ.jpeg'],
+        'user': {'id': str(ObjectId()), 'username': 'Julia', 'image': 'https://i.imgur.com/9P3c7an.jpeg'},
+        'location': 'Krakow',
+        'timestamp': datetime.utcnow(),
+        'reactions_count': {reaction_type: index % 7 for reaction_type in REACTION_TYPES[:3]},
+        'user_reaction': 'heart' if index % 2 else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark post list serialisation')
+    parser.add_argument('--posts', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    page = {'posts': [sample_post(index) for index in range(args.posts)], 'next_cursor': 'cursor'}
+    encoder = compile_model(post_list_model)
+
+    assert json.loads(json.dumps(marshal(page, post_list_model))) == json.loads(encode(encoder(page)))
+
+    runs = {
+        'marshal + json': lambda: json.dumps(marshal(page, post_list_model)).encode('utf-8'),
+        'compiled + orjson': lambda: encode(encoder(page)),
+    }
+    for name, run in runs.items():
+        seconds = min(timeit.repeat(run, number=args.repeat, repeat=5))
+        print(f'{name:>20}: {seconds / (args.repeat * args.posts) * 1e6:8.2f} us/post')
+
+
+if __name__ == '__main__':
+    main()
@@ -8,16 +8,39 @@ from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 
 from .utils.logger_config import config_logger
+from .utils.apps import DATABASE, PURGE, DISPATCH, NOTIFICATIONS, IMAGES
+from .utils.dispatcher import dispatcher
+from .database import MongoDBConnect
+from .database.indexes import ensure_indexes
+from .database.purge import purger
+from .utils.qr_batch import start_pool
 
 
+# forked while the process has a single thread, before the database and background workers start theirs
+start_pool()
+
 app = Flask(__name__)
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
+# requests with larger bodies are rejected with 413 before they are parsed
+app.config['MAX_CONTENT_LENGTH'] = IMAGES.max_request_bytes
 
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor', 'ETag'])
 config_logger(app, DEBUG)
 JWTManager(app)
 
+if DATABASE.warm_up:
+    MongoDBConnect.warm_up()
+
+if DATABASE.ensure_indexes:
+    ensure_indexes(MongoDBConnect().db)
+
+if PURGE.enabled:
+    purger.start()
+
+if DISPATCH.enabled and NOTIFICATIONS.mode == 'http':
+    dispatcher.start()
+
 blueprint = Blueprint('api', __name__)
 api = Api(blueprint, version = '1.0.0', title = 'PetBook Controller API')
 
@@ -29,6 +52,8 @@ from .endpoints.post import api as post
 from .endpoints.comment import api as comment
 from .endpoints.reaction import api as reaction
 from .endpoints.notification import api as notification
+from .endpoints.metrics import api as metrics
+from .endpoints.images import api as images
 
 
 api.add_namespace(user)
@@ -38,5 +63,7 @@ api.add_namespace(post)
 api.add_namespace(comment)
 api.add_namespace(reaction)
 api.add_namespace(notification)
+api.add_namespace(metrics)
+api.add_namespace(images)
 
 app.register_blueprint(blueprint)
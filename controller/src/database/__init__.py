@@ -1,24 +1,103 @@
 import os
-from typing import Callable
+import time
+import atexit
+import inspect
+from threading import Lock
+from typing import Callable, Iterator
 import logging
 
 import pymongo
-from pymongo import MongoClient
-from pymongo.errors import OperationFailure
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import OperationFailure, PyMongoError
+
+from ..utils.apps import DATABASE
+from .monitoring import CommandMonitor, profiled, log_slow_query
 
 
 log = logging.getLogger('MONGO')
 
 
 class MongoDBConnect:
+    '''
+    Thin facade over a single pooled `MongoClient` shared by the whole process.
+
+    The client is created lazily on first use and recreated after a fork
+    (a `MongoClient` must never be shared between parent and child process),
+    so constructing `Queries()` per request is cheap.
+    '''
+
+    _client: MongoClient | None = None
+    _client_pid: int | None = None
+    _client_lock: Lock = Lock()
+
+    def __init_subclass__(cls, **kwargs):
+        '''
+        Profile every public method of `Queries`-like subclasses, so latency
+        and slow queries are attributed to the method that issued them.
+        '''
+        super().__init_subclass__(**kwargs)
+        for name, attr in list(vars(cls).items()):
+            # generators run after the call returns, timing them would only measure their creation
+            if not name.startswith('_') and inspect.isfunction(attr) and not inspect.isgeneratorfunction(attr):
+                setattr(cls, name, profiled(name, attr))
 
     def __init__(self):
-        self.client = MongoClient(
+        self.client = self.get_client()
+        self.db = self.client[os.environ.get('MONGODB_DATABASE')]
+
+    @classmethod
+    def get_client(cls) -> MongoClient:
+        pid = os.getpid()
+        if cls._client is None or cls._client_pid != pid:
+            with cls._client_lock:
+                if cls._client is None or cls._client_pid != pid:
+                    cls._client = cls._create_client()
+                    cls._client_pid = pid
+        return cls._client
+
+    @staticmethod
+    def _create_client() -> MongoClient:
+        options = {
+            'maxPoolSize': DATABASE.max_pool_size,
+            'minPoolSize': DATABASE.min_pool_size,
+            'maxIdleTimeMS': DATABASE.max_idle_time_ms,
+            'connectTimeoutMS': DATABASE.connect_timeout_ms,
+            'serverSelectionTimeoutMS': DATABASE.server_selection_timeout_ms,
+            'socketTimeoutMS': DATABASE.socket_timeout_ms or None,
+        }
+        if DATABASE.compressors:
+            options['compressors'] = DATABASE.compressors
+
+        log.info(f'Creating MongoDB client for process {os.getpid()} with {options = }')
+        return MongoClient(
             os.environ.get('MONGODB_URI'),
             username=os.environ.get('MONGODB_USER'),
-            password=os.environ.get('MONGODB_PASSWORD')
+            password=os.environ.get('MONGODB_PASSWORD'),
+            event_listeners=[CommandMonitor()],
+            **options
         )
-        self.db = self.client[os.environ.get('MONGODB_DATABASE')]
+
+    @classmethod
+    def warm_up(cls) -> bool:
+        '''
+        Establish the connection pool at startup, so the first requests
+        do not pay for handshake, authentication and topology discovery.
+        '''
+        try:
+            cls.get_client().admin.command('ping')
+            log.info('MongoDB client warmed up')
+            return True
+        except PyMongoError as e:
+            log.error(f'Cannot warm up MongoDB client: {e}')
+            return False
+
+    @classmethod
+    def close(cls) -> None:
+        with cls._client_lock:
+            if cls._client is not None and cls._client_pid == os.getpid():
+                cls._client.close()
+            cls._client = None
+            cls._client_pid = None
     
     def transaction(func: Callable) -> Callable:
         '''
@@ -42,9 +121,6 @@ class MongoDBConnect:
                 
         return wrapper
     
-    def __del__(self) -> None:
-        self.client.close()
-
     def get_collection(self, collection_name: str):
         return self.db[collection_name]
 
@@ -56,27 +132,79 @@ class MongoDBConnect:
         collection = self.get_collection(collection_name)
         return collection.update_one(filter, new_values, session=session)
 
+    def replace_one(self, collection_name: str, filter: dict, document: dict, upsert: bool = False, session: pymongo.client_session.ClientSession | None = None) -> pymongo.results.UpdateResult:
+        collection = self.get_collection(collection_name)
+        return collection.replace_one(filter, document, upsert=upsert, session=session)
+
     def delete_one(self, collection_name: str, filter: dict, session: pymongo.client_session.ClientSession | None = None) -> pymongo.results.InsertOneResult:
         collection = self.get_collection(collection_name)
         return collection.delete_one(filter, session=session)
     
+    def find_one_and_update(self, collection_name: str, filter: dict, update: dict, projection=None, upsert: bool = False, return_document: bool = ReturnDocument.BEFORE, session: pymongo.client_session.ClientSession | None = None) -> dict | None:
+        collection = self.get_collection(collection_name)
+        return collection.find_one_and_update(filter, update, projection, upsert=upsert, return_document=return_document, session=session)
+
     def find_one_and_delete(self, collection_name: str, filter: dict, session: pymongo.client_session.ClientSession | None = None) -> pymongo.results.InsertOneResult:
         collection = self.get_collection(collection_name)
         return collection.find_one_and_delete(filter, session=session)
 
-    def find(self, collection_name: str, filter: dict = {}, projection=None) -> list[dict]:
+    def _check_slow(self, collection_name: str, operation: str, command: dict, start: float) -> None:
+        '''
+        Capture `explain('executionStats')` of the read which exceeded `database.slow_query_ms`.
+        '''
+        duration_ms = (time.perf_counter() - start) * 1000
+        if DATABASE.slow_query_ms is None or duration_ms < DATABASE.slow_query_ms:
+            return
+
+        command = {key: value for key, value in command.items() if value is not None}
+
+        explain = None
+        if DATABASE.explain_slow_queries:
+            try:
+                explain = self.db.command('explain', {operation: collection_name, **command}, verbosity='executionStats')
+            except PyMongoError as e:
+                log.error(f'Cannot explain slow {operation} on {collection_name}: {e}')
+
+        log_slow_query(collection_name, operation, command, duration_ms, explain)
+
+    def find(self, collection_name: str, filter: dict = {}, projection=None, sort: list[tuple[str, int]] | None = None, limit: int = 0) -> list[dict]:
         collection = self.get_collection(collection_name)
-        return list(collection.find(filter, projection))
+        start = time.perf_counter()
+        result = list(collection.find(filter, projection, sort=sort, limit=limit))
+        self._check_slow(collection_name, 'find', {'filter': filter, 'projection': projection, 'sort': dict(sort) if sort else None, 'limit': limit or None}, start)
+        return result
     
     def find_one(self, collection_name: str, filter: dict = {}, projection=None) -> dict:
         collection = self.get_collection(collection_name)
-        return collection.find_one(filter, projection)
+        start = time.perf_counter()
+        result = collection.find_one(filter, projection)
+        self._check_slow(collection_name, 'find', {'filter': filter, 'projection': projection, 'limit': 1}, start)
+        return result
 
     def find_aggregate(self, collection_name: str, pipeline: list[dict]) -> list[dict]:
-        collection = self.get_collection(collection_name)        
-        return list(collection.aggregate(pipeline))
+        collection = self.get_collection(collection_name)
+        start = time.perf_counter()
+        result = list(collection.aggregate(pipeline))
+        self._check_slow(collection_name, 'aggregate', {'pipeline': pipeline, 'cursor': {}}, start)
+        return result
+
+    def iter_find(self, collection_name: str, filter: dict = {}, projection=None, sort: list[tuple[str, int]] | None = None, batch_size: int | None = None) -> Iterator[dict]:
+        '''
+        Stream documents batch by batch instead of materialising the whole result.
+        '''
+        collection = self.get_collection(collection_name)
+        with collection.find(filter, projection, sort=sort, batch_size=batch_size or DATABASE.stream_batch_size) as cursor:
+            yield from cursor
+
+    def iter_aggregate(self, collection_name: str, pipeline: list[dict], batch_size: int | None = None) -> Iterator[dict]:
+        collection = self.get_collection(collection_name)
+        with collection.aggregate(pipeline, batchSize=batch_size or DATABASE.stream_batch_size, allowDiskUse=True) as cursor:
+            yield from cursor
+
     def delete_many(self, collection_name: str, query: dict):
         collection = self.db[collection_name]  
         delete_result = collection.delete_many(query)  
         return delete_result
-    
\ No newline at end of file
+
+
+atexit.register(MongoDBConnect.close)
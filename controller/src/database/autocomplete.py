@@ -0,0 +1,127 @@
+import time
+import bisect
+import logging
+from threading import Lock
+from typing import Callable, Iterable
+
+from bson.objectid import ObjectId
+
+from .cache import LRUCache
+from ..utils.apps import Cache, Caches
+
+
+log = logging.getLogger('AUTOCOMPLETE')
+
+# maximal number of usernames suggested for one prefix
+AUTOCOMPLETE_LIMIT = 10
+
+
+def normalise_username(username: str) -> str:
+    '''
+    Key of `users.username_lower`, usernames are matched case insensitively by its prefix.
+    '''
+    return (username or '').strip().lower()
+
+
+def prefix_range(prefix: str) -> tuple[str, str]:
+    '''
+    Bounds `[lower, upper)` of all strings starting with non-empty `prefix` in binary order.
+    '''
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class UsernameAutocomplete:
+    '''
+    Sorted array of `(username_lower, user id)` pairs answering prefix queries by bisection.
+
+    The array is loaded lazily and refreshed incrementally with users inserted since
+    the last seen `_id` (usernames never change), at most once per `ttl_seconds`.
+    When there are more than `max_size` users the array is dropped and `search`
+    returns `None`, so the caller falls back to the indexed range query.
+    Answers for hot prefixes are kept in a small LRU cache.
+    '''
+
+    def __init__(self, config: Cache, hot_queries: Cache):
+        self.max_size = config.max_size
+        self.refresh_seconds = config.ttl_seconds
+        self.entries: list[tuple[str, str]] = []
+        self.last_id: ObjectId | None = None
+        self.refreshed_at = 0.0
+        self.overflow = False
+        self.lock = Lock()
+        self.hot_queries = LRUCache(hot_queries)
+
+    def _insert(self, username_lower: str, id: str) -> None:
+        entry = (username_lower, id)
+        index = bisect.bisect_left(self.entries, entry)
+        if index < len(self.entries) and self.entries[index] == entry:
+            # added locally by `add` before the refresh loaded it
+            return
+        self.entries.insert(index, entry)
+        if len(self.entries) > self.max_size:
+            log.warning(f'More than {self.max_size} usernames, falling back to database queries')
+            self.entries = []
+            self.overflow = True
+
+    def refresh(self, loader: Callable[[ObjectId | None, int], Iterable[dict]]) -> None:
+        '''
+        :param loader: Returns at most given number of users (`_id`, `username_lower`)
+            with `_id` greater than given one, ordered by `_id`
+        '''
+        with self.lock:
+            if self.overflow or time.monotonic() - self.refreshed_at < self.refresh_seconds:
+                return
+
+            added = 0
+            for user in loader(self.last_id, self.max_size + 1 - len(self.entries)):
+                self.last_id = user['_id']
+                if user.get('username_lower'):
+                    self._insert(user['username_lower'], str(user['_id']))
+                    added += 1
+                if self.overflow:
+                    return
+
+            self.refreshed_at = time.monotonic()
+
+        if added:
+            self.hot_queries.clear()
+
+    def add(self, id: str | ObjectId, username: str) -> None:
+        '''
+        Register user created by this process without waiting for the next refresh.
+        '''
+        with self.lock:
+            if self.overflow or self.last_id is None:
+                return
+            self._insert(normalise_username(username), str(id))
+        self.hot_queries.clear()
+
+    def search(self, prefix: str, limit: int, loader: Callable[[ObjectId | None, int], Iterable[dict]]) -> list[str] | None:
+        '''
+        IDs of at most `limit` users whose normalised username starts with `prefix`, in username order.
+        '''
+        key = (prefix, limit)
+        ids = self.hot_queries.get(key)
+        if ids is not None:
+            return ids
+
+        self.refresh(loader)
+
+        with self.lock:
+            if self.overflow:
+                return None
+            lower, upper = prefix_range(prefix)
+            start = bisect.bisect_left(self.entries, (lower,))
+            stop = min(bisect.bisect_left(self.entries, (upper,)), start + limit)
+            ids = [id for _, id in self.entries[start:stop]]
+
+        self.hot_queries.set(key, ids)
+        return ids
+
+    def stats(self) -> dict:
+        with self.lock:
+            size = len(self.entries)
+        return {'size': size, **{f'hot_{key}': value for key, value in self.hot_queries.stats().items()}}
+
+
+usernames = UsernameAutocomplete(Caches.USERNAMES, Caches.AUTOCOMPLETE)
@@ -0,0 +1,148 @@
+import time
+import logging
+from threading import Lock
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable
+
+from ..utils.apps import Cache, Caches
+
+
+log = logging.getLogger('CACHE')
+
+
+class LRUCache:
+    '''
+    Bounded, thread safe LRU cache with per-entry time to live.
+    '''
+
+    def __init__(self, config: Cache):
+        self.max_size = config.max_size
+        self.ttl_seconds = config.ttl_seconds
+        self.entries: OrderedDict[Hashable, tuple[float, object]] = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> object | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: object) -> None:
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class AuthorCache(LRUCache):
+    '''
+    Summaries (`id`, `username`, `image`) of users shown next to posts, comments and reactions.
+    '''
+
+    def get_many(self, ids: Iterable, loader: Callable[[list], list[dict]]) -> dict[str, dict]:
+        '''
+        Resolve summaries of users with given ids, fetching all misses
+        with single `loader` call (expected to query users by `$in`).
+        '''
+        summaries = {}
+        misses = []
+
+        for id in {str(id) for id in ids if id}:
+            summary = self.get(id)
+            if summary is None:
+                misses.append(id)
+            else:
+                summaries[id] = summary
+
+        if misses:
+            for user in loader(misses):
+                summary = {
+                    'id': str(user['_id']),
+                    'username': user.get('username'),
+                    'image': user.get('profile_picture_url'),
+                }
+                self.set(summary['id'], summary)
+                summaries[summary['id']] = summary
+
+        return summaries
+
+
+class FragmentCache:
+    '''
+    Thread safe LRU of serialised fragments bounded by their total size in bytes
+    (`max_size` of the config). Each entity has at most one entry, stored with the
+    version it was rendered from, so a fragment of an older version is a miss.
+    '''
+
+    def __init__(self, config: Cache):
+        self.max_bytes = config.max_size
+        self.ttl_seconds = config.ttl_seconds
+        self.entries: OrderedDict[str, tuple[float, Hashable, bytes]] = OrderedDict()
+        self.size = 0
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, id: Hashable, version: Hashable) -> bytes | None:
+        id = str(id)
+        with self.lock:
+            entry = self.entries.get(id)
+            if entry is None or entry[1] != version or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(id)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, id: Hashable, version: Hashable, fragment: bytes) -> None:
+        id = str(id)
+        if len(fragment) > self.max_bytes:
+            return
+
+        with self.lock:
+            previous = self.entries.pop(id, None)
+            if previous is not None:
+                self.size -= len(previous[2])
+
+            self.entries[id] = (time.monotonic() + self.ttl_seconds, version, fragment)
+            self.size += len(fragment)
+            while self.size > self.max_bytes:
+                _, (_, _, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def invalidate(self, id: Hashable) -> None:
+        with self.lock:
+            entry = self.entries.pop(str(id), None)
+            if entry is not None:
+                self.size -= len(entry[2])
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'size': len(self.entries), 'bytes': self.size, 'hits': self.hits, 'misses': self.misses}
+
+
+authors = AuthorCache(Caches.AUTHORS)
+post_fragments = FragmentCache(Caches.POST_FRAGMENTS)
@@ -0,0 +1,179 @@
+'''
+Declarative registry of MongoDB indexes used by `Queries`.
+
+Indexes are ensured idempotently at startup (see `database.ensure_indexes`
+in apps.yaml) or from the command line:
+
+    python -m src.database.indexes ensure
+    python -m src.database.indexes verify
+'''
+import sys
+import json
+import logging
+import argparse
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.database import Database
+from pymongo.errors import OperationFailure, PyMongoError
+
+
+log = logging.getLogger('INDEXES')
+
+# unique indexes of `users` signup relies on
+UNIQUE_USER_INDEXES = ('username_unique', 'email_unique')
+
+
+INDEXES: dict[str, list[IndexModel]] = {
+    'users': [
+        # login, signup uniqueness checks, profile by username
+        IndexModel([('username', ASCENDING)], name='username_unique', unique=True),
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+        # search_users_by_username: prefix range over the normalised username
+        IndexModel([('username_lower', ASCENDING)], name='username_lower'),
+    ],
+    'posts': [
+        # global feed: keyset pagination over (timestamp, _id)
+        IndexModel([('timestamp', DESCENDING), ('_id', DESCENDING)], name='timestamp_id'),
+        # profile feed: $match user_id, keyset pagination over (timestamp, _id)
+        IndexModel([('user_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)], name='user_id_timestamp_id'),
+        # search_posts: tokenised inverted index over the description, ranked by textScore
+        IndexModel([('description', TEXT)], name='description_text'),
+        # purger: soft-deleted posts, oldest deletions first
+        IndexModel([('deleted_at', ASCENDING)], name='deleted_at', sparse=True),
+    ],
+    'comments': [
+        # fetch_comments: $match post_id, keyset pagination over (timestamp, _id)
+        IndexModel([('post_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)], name='post_id_timestamp_id'),
+        # export_user: user's own comments in (timestamp, _id) order
+        IndexModel([('user_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)], name='user_id_timestamp_id'),
+    ],
+    'reactions': [
+        # insert_reaction / delete_reaction lookup, one reaction per user and post, purger by post_id prefix
+        IndexModel([('post_id', ASCENDING), ('user_id', ASCENDING)], name='post_id_user_id_unique', unique=True),
+    ],
+    'scans': [
+        # user's scan history, reverse lookup replacing the embedded `users.scans` array, export_user
+        IndexModel([('user_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)], name='user_id_timestamp_id'),
+    ],
+    'notifications': [
+        # get_notifications: owner's inbox with keyset pagination over (timestamp, _id)
+        IndexModel([('owner_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)], name='owner_id_timestamp_id'),
+        # purger: drop notifications about the deleted post
+        IndexModel([('post_id', ASCENDING)], name='post_id', sparse=True),
+    ],
+}
+
+
+def _key(index: dict) -> list[tuple[str, int]]:
+    return [(field, direction) for field, direction in index['key'].items()]
+
+
+def has_unique_user_indexes(db: Database) -> bool:
+    '''
+    Whether username and email uniqueness of users is enforced by the database.
+    Signup relies on these indexes to reject duplicates.
+    '''
+    existing = db['users'].index_information()
+    declared = {index.document['name']: index.document for index in INDEXES['users']}
+    return all(
+        name in existing
+        and existing[name]['key'] == _key(declared[name])
+        and existing[name].get('unique', False)
+        for name in UNIQUE_USER_INDEXES
+    )
+
+
+def ensure_indexes(db: Database) -> dict[str, list[str]]:
+    '''
+    Create every declared index that does not exist yet.
+    Index builds are idempotent, so calling it on every start is safe.
+
+    Returns names of indexes which could not be created, grouped by collection
+    (e.g. unique index over collection that already holds duplicates).
+    '''
+    failed = {}
+
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+
+        for index in indexes:
+            name = index.document['name']
+            try:
+                collection.create_indexes([index])
+            except OperationFailure as e:
+                log.error(f'Cannot create index {collection_name}.{name}: {e}')
+                failed.setdefault(collection_name, []).append(name)
+            except PyMongoError as e:
+                log.error(f'Cannot ensure indexes, database unavailable: {e}')
+                failed.setdefault(collection_name, []).append(name)
+                return failed
+
+    log.info(f'Indexes ensured, failed: {failed}')
+    return failed
+
+
+def verify_indexes(db: Database) -> dict[str, dict[str, list[str]]]:
+    '''
+    Compare declared indexes with the ones present in the database.
+
+    For every collection reports:
+    - `missing` - declared, but absent or built with different keys/options,
+    - `undeclared` - present in the database, but not in the registry,
+    - `unused` - present, but never used since the last server restart (`$indexStats`).
+    '''
+    report = {}
+
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        existing = collection.index_information()
+
+        try:
+            usage = {
+                stats['name']: stats['accesses']['ops']
+                for stats in collection.aggregate([{'$indexStats': {}}])
+            }
+        except OperationFailure as e:
+            log.error(f'Cannot read $indexStats for {collection_name}: {e}')
+            usage = {}
+
+        declared = {index.document['name']: index.document for index in indexes}
+
+        missing = [
+            name for name, index in declared.items()
+            if name not in existing
+            or existing[name]['key'] != _key(index)
+            or existing[name].get('unique', False) != index.get('unique', False)
+        ]
+        undeclared = [name for name in existing if name != '_id_' and name not in declared]
+        unused = [name for name in existing if name != '_id_' and usage.get(name) == 0]
+
+        report[collection_name] = {
+            'missing': missing,
+            'undeclared': undeclared,
+            'unused': unused,
+        }
+
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    from . import MongoDBConnect
+
+    parser = argparse.ArgumentParser(description='Manage PetBook MongoDB indexes')
+    parser.add_argument('command', choices=['ensure', 'verify'])
+    args = parser.parse_args(argv)
+
+    db = MongoDBConnect().db
+
+    if args.command == 'ensure':
+        failed = ensure_indexes(db)
+        print(json.dumps({'failed': failed}, indent=2))
+        return 1 if failed else 0
+
+    report = verify_indexes(db)
+    print(json.dumps(report, indent=2))
+    return 1 if any(result['missing'] for result in report.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
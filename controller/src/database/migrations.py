@@ -0,0 +1,218 @@
+'''
+Data migrations and backfills for denormalised fields.
+
+Every migration is idempotent and can be rerun safely:
+
+    python -m src.database.migrations <name>
+'''
+import sys
+import json
+import logging
+import argparse
+from typing import Callable
+
+from pymongo import UpdateOne
+from pymongo.database import Database
+
+
+log = logging.getLogger('MIGRATIONS')
+
+BATCH_SIZE = 1000
+
+
+def _bulk_write(db: Database, collection_name: str, operations: list) -> int:
+    if not operations:
+        return 0
+    result = db[collection_name].bulk_write(operations, ordered=False)
+    return result.modified_count
+
+
+def reactions_count(db: Database) -> dict:
+    '''
+    Recompute per-type `posts.reactions_count` counters from the `reactions` collection.
+    '''
+    pipeline = [
+        {'$group': {
+            '_id': {'post_id': '$post_id', 'reaction_type': '$reaction_type'},
+            'count': {'$sum': 1}
+        }},
+        {'$group': {
+            '_id': '$_id.post_id',
+            'counts': {'$push': {'k': '$_id.reaction_type', 'v': '$count'}}
+        }},
+    ]
+
+    modified = db['posts'].update_many(
+        {'reactions_count': {'$exists': False}},
+        {'$set': {'reactions_count': {}}}
+    ).modified_count
+    operations = []
+
+    for post in db['reactions'].aggregate(pipeline, allowDiskUse=True):
+        counts = {count['k']: count['v'] for count in post['counts'] if count['k']}
+        operations.append(UpdateOne({'_id': post['_id']}, {'$set': {'reactions_count': counts}}))
+
+        if len(operations) >= BATCH_SIZE:
+            modified += _bulk_write(db, 'posts', operations)
+            operations = []
+
+    modified += _bulk_write(db, 'posts', operations)
+    return {'modified': modified}
+
+
+def _post_notification_pipeline(notification_type: str, fields: dict) -> list[dict]:
+    return [
+        {'$match': {'is_notification': True}},
+        {'$lookup': {
+            'from': 'posts',
+            'localField': 'post_id',
+            'foreignField': '_id',
+            'pipeline': [{'$project': {'user_id': 1}}],
+            'as': 'post'
+        }},
+        {'$unwind': '$post'},
+        {'$lookup': {
+            'from': 'users',
+            'localField': 'user_id',
+            'foreignField': '_id',
+            'pipeline': [{'$project': {'username': 1}}],
+            'as': 'user'
+        }},
+        {'$project': {
+            'owner_id': '$post.user_id',
+            'notification_type': {'$literal': notification_type},
+            'timestamp': 1,
+            'post_id': 1,
+            'user_id': 1,
+            'username': {'$arrayElemAt': ['$user.username', 0]},
+            **fields
+        }},
+        {'$merge': {
+            'into': 'notifications',
+            'on': '_id',
+            'whenMatched': 'keepExisting',
+            'whenNotMatched': 'insert'
+        }},
+    ]
+
+
+def notifications_inbox(db: Database) -> dict:
+    '''
+    Backfill the `notifications` inbox from comments, reactions and scans
+    which are still flagged with `is_notification`. Existing inbox entries are kept
+    and the flag is dropped afterwards.
+    '''
+    before = db['notifications'].estimated_document_count()
+
+    db['comments'].aggregate(_post_notification_pipeline('comment', {}), allowDiskUse=True)
+    db['reactions'].aggregate(_post_notification_pipeline('reaction', {'reaction_type': 1}), allowDiskUse=True)
+    db['scans'].aggregate([
+        {'$match': {'is_notification': True}},
+        {'$project': {
+            'owner_id': '$user_id',
+            'notification_type': {'$literal': 'scan'},
+            'timestamp': 1,
+            'city': 1,
+            'latitude': 1,
+            'longitude': 1
+        }},
+        {'$merge': {
+            'into': 'notifications',
+            'on': '_id',
+            'whenMatched': 'keepExisting',
+            'whenNotMatched': 'insert'
+        }},
+    ], allowDiskUse=True)
+
+    # the inbox is the source of truth from now on, so a rerun cannot resurrect removed notifications
+    for collection_name in ('comments', 'reactions', 'scans'):
+        db[collection_name].update_many({'is_notification': {'$exists': True}}, {'$unset': {'is_notification': ''}})
+
+    return {'inserted': db['notifications'].estimated_document_count() - before}
+
+
+def _merge_counts(db: Database, source: str, key: str, target: str, field: str) -> None:
+    db[source].aggregate([
+        {'$group': {'_id': f'${key}', field: {'$sum': 1}}},
+        {'$merge': {
+            'into': target,
+            'on': '_id',
+            'whenMatched': 'merge',
+            'whenNotMatched': 'discard'
+        }},
+    ], allowDiskUse=True)
+
+
+def embedded_arrays(db: Database) -> dict:
+    '''
+    Replace unbounded `users.posts`, `users.scans`, `posts.comments` and `posts.reactions`
+    id arrays with counters recomputed from the source collections, then drop the arrays.
+    '''
+    for collection_name, fields in (('users', ('posts_count', 'scans_count')), ('posts', ('comments_count',))):
+        for field in fields:
+            db[collection_name].update_many({field: {'$exists': False}}, {'$set': {field: 0}})
+
+    _merge_counts(db, 'posts', 'user_id', 'users', 'posts_count')
+    _merge_counts(db, 'scans', 'user_id', 'users', 'scans_count')
+    _merge_counts(db, 'comments', 'post_id', 'posts', 'comments_count')
+    reactions_count(db)
+
+    unset = {
+        'users': db['users'].update_many(
+            {'$or': [{'posts': {'$exists': True}}, {'scans': {'$exists': True}}]},
+            {'$unset': {'posts': '', 'scans': ''}}
+        ).modified_count,
+        'posts': db['posts'].update_many(
+            {'$or': [{'comments': {'$exists': True}}, {'reactions': {'$exists': True}}]},
+            {'$unset': {'comments': '', 'reactions': ''}}
+        ).modified_count,
+    }
+    return {'unset': unset}
+
+
+def username_lower(db: Database) -> dict:
+    '''
+    Backfill the normalised `users.username_lower` key used by username autocomplete.
+    '''
+    from .autocomplete import normalise_username
+
+    modified = 0
+    operations = []
+
+    for user in db['users'].find({'username_lower': {'$exists': False}}, {'username': True}):
+        operations.append(UpdateOne(
+            {'_id': user['_id']},
+            {'$set': {'username_lower': normalise_username(user.get('username'))}}
+        ))
+
+        if len(operations) >= BATCH_SIZE:
+            modified += _bulk_write(db, 'users', operations)
+            operations = []
+
+    modified += _bulk_write(db, 'users', operations)
+    return {'modified': modified}
+
+
+MIGRATIONS: dict[str, Callable[[Database], dict]] = {
+    'reactions_count': reactions_count,
+    'notifications_inbox': notifications_inbox,
+    'embedded_arrays': embedded_arrays,
+    'username_lower': username_lower,
+}
+
+
+def main(argv: list[str] | None = None) -> int:
+    from . import MongoDBConnect
+
+    parser = argparse.ArgumentParser(description='Run PetBook data migrations')
+    parser.add_argument('migration', choices=list(MIGRATIONS))
+    args = parser.parse_args(argv)
+
+    result = MIGRATIONS[args.migration](MongoDBConnect().db)
+    log.info(f'Migration {args.migration} finished: {result}')
+    print(json.dumps(result, indent=2, default=str))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+'''
+Query instrumentation for `MongoDBConnect`.
+
+- `CommandMonitor` is registered as a pymongo command listener and records
+  server-side latency of every command, attributed to the `Queries` method
+  that issued it,
+- `profiled` wraps `Queries` methods and records their wall-clock latency,
+- `log_slow_query` writes calls above the configured threshold, together
+  with their `explain('executionStats')`, to the rotating slow-query log.
+'''
+import time
+import logging
+from threading import Lock
+from functools import wraps
+from contextvars import ContextVar
+from typing import Callable
+
+from pymongo import monitoring
+
+
+log = logging.getLogger('MONITORING')
+slow_log = logging.getLogger('SLOW_QUERY')
+
+current_method: ContextVar[str | None] = ContextVar('current_method', default=None)
+
+
+class QueryStats:
+    '''
+    Thread safe aggregates of latency and documents examined/returned per key.
+    '''
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = Lock()
+
+    def _entry(self, key: str) -> dict:
+        return self.stats.setdefault(key, {
+            'calls': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'n_returned': 0,
+            'slow': 0,
+            'slow_docs_examined': 0,
+            'slow_n_returned': 0,
+        })
+
+    def record(self, key: str, duration_ms: float, n_returned: int | None = None) -> None:
+        with self.lock:
+            entry = self._entry(key)
+            entry['calls'] += 1
+            entry['total_ms'] += duration_ms
+            entry['max_ms'] = max(entry['max_ms'], duration_ms)
+            if n_returned:
+                entry['n_returned'] += n_returned
+
+    def record_slow(self, key: str, docs_examined: int | None, n_returned: int | None) -> None:
+        '''
+        Documents examined are known only for explained (slow) calls,
+        so they are aggregated separately from the regular counters.
+        '''
+        with self.lock:
+            entry = self._entry(key)
+            entry['slow'] += 1
+            entry['slow_docs_examined'] += docs_examined or 0
+            entry['slow_n_returned'] += n_returned or 0
+
+    def snapshot(self) -> dict[str, dict]:
+        with self.lock:
+            return {
+                key: {**entry, 'avg_ms': entry['total_ms'] / entry['calls'] if entry['calls'] else 0.0}
+                for key, entry in self.stats.items()
+            }
+
+    def reset(self) -> None:
+        with self.lock:
+            self.stats.clear()
+
+
+method_stats = QueryStats()
+command_stats = QueryStats()
+
+
+def _n_returned(reply: dict) -> int | None:
+    cursor = reply.get('cursor')
+    if cursor:
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+    return reply.get('n')
+
+
+class CommandMonitor(monitoring.CommandListener):
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        key = f'{current_method.get() or "-"}:{event.command_name}'
+        command_stats.record(key, event.duration_micros / 1000, n_returned=_n_returned(event.reply))
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        log.error(f'Command {event.command_name} failed after {event.duration_micros / 1000:.1f} ms: {event.failure}')
+
+
+def profiled(name: str, func: Callable) -> Callable:
+    '''
+    Record latency of a `Queries` method and expose its name to `CommandMonitor`.
+    '''
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        token = current_method.set(name)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            method_stats.record(name, (time.perf_counter() - start) * 1000)
+            current_method.reset(token)
+
+    return wrapper
+
+
+def execution_stats(explain: dict) -> dict:
+    '''
+    Extract `executionStats` from explain output of find or aggregate,
+    which for aggregate may be nested in the `$cursor` stage.
+    '''
+    if 'executionStats' in explain:
+        return explain['executionStats']
+
+    for stage in explain.get('stages', []):
+        cursor = stage.get('$cursor', {})
+        if 'executionStats' in cursor:
+            return cursor['executionStats']
+
+    return {}
+
+
+def log_slow_query(collection_name: str, operation: str, query, duration_ms: float, explain: dict | None) -> None:
+    method = current_method.get() or '-'
+    stats = execution_stats(explain or {})
+    docs_examined = stats.get('totalDocsExamined')
+    keys_examined = stats.get('totalKeysExamined')
+    n_returned = stats.get('nReturned')
+
+    method_stats.record_slow(method, docs_examined, n_returned)
+    slow_log.warning(
+        f'{method} {operation} on {collection_name} took {duration_ms:.1f} ms, '
+        f'{docs_examined = }, {keys_examined = }, {n_returned = }, {query = }, {explain = }'
+    )
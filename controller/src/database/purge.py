@@ -0,0 +1,318 @@
+'''
+Background purge of soft-deleted posts and sweeping of orphaned references.
+
+`Queries.delete_post` only marks the post with `deleted_at`. The purger removes
+its reactions, comments and notifications in throttled batches, and the post
+document itself last. The marked post is the progress record, so an
+interrupted purge resumes on the next run. Only the process holding the `purge`
+lease in the `jobs` collection works, so several workers do not compete. The
+lease is extended between batches, a run which loses it stops before its next
+deletion.
+
+Orphaned references are swept in bounded passes over each dependent collection
+in `_id` order, `sweep_max_documents` per sweep, resuming where the previous
+sweep stopped. Each batch costs one `$in` lookup of its posts.
+
+Single runs from the command line:
+
+    python -m src.database.purge posts
+    python -m src.database.purge orphans
+'''
+import os
+import sys
+import json
+import socket
+import logging
+import argparse
+from threading import Event, Lock, Thread
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from ..utils.apps import Purge, PURGE
+
+
+log = logging.getLogger('PURGE')
+
+# collections referencing posts by `post_id`, purged in this order
+DEPENDENTS = ('reactions', 'comments', 'notifications')
+
+
+class PostPurger:
+
+    def __init__(self, config: Purge):
+        self.config = config
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self.thread: Thread | None = None
+        self.wake_event = Event()
+        self.stop_event = Event()
+        self.lock = Lock()
+        self.last_sweep: datetime | None = None
+        self.lease_until: datetime | None = None
+        self.counters = {
+            'posts_purged': 0,
+            'documents_purged': 0,
+            'orphans_purged': 0,
+            'errors': 0,
+        }
+
+    def _count(self, counter: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[counter] += value
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                **self.counters,
+                'running': bool(self.thread and self.thread.is_alive()),
+                'last_sweep': self.last_sweep.isoformat() if self.last_sweep else None,
+            }
+
+    def _pause(self) -> bool:
+        '''
+        Throttle between batches, returns `True` if the purger is being stopped.
+        '''
+        return self.stop_event.wait(self.config.batch_pause_ms / 1000)
+
+    def _acquire_lease(self, db: Database) -> bool:
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=self.config.lease_seconds)
+        try:
+            db['jobs'].find_one_and_update(
+                {'_id': 'purge', '$or': [{'lease_until': {'$lt': now}}, {'owner': self.owner}]},
+                {'$set': {'owner': self.owner, 'lease_until': lease_until}},
+                upsert=True
+            )
+            self.lease_until = lease_until
+            return True
+        except DuplicateKeyError:
+            # lease is held by another process
+            self.lease_until = None
+            return False
+
+    def _hold_lease(self, db: Database) -> bool:
+        '''
+        Extend the lease once half of it has passed, called before every deletion.
+        Returns `False` if the lease expired or was taken over, the run must stop.
+        '''
+        if self.lease_until is None:
+            return False
+
+        now = datetime.utcnow()
+        if now < self.lease_until - timedelta(seconds=self.config.lease_seconds / 2):
+            return True
+
+        lease_until = now + timedelta(seconds=self.config.lease_seconds)
+        result = db['jobs'].update_one(
+            {'_id': 'purge', 'owner': self.owner, 'lease_until': {'$gte': now}},
+            {'$set': {'lease_until': lease_until}}
+        )
+        if result.matched_count == 0:
+            log.warning('Purge lease lost, stopping the run')
+            self.lease_until = None
+            return False
+
+        self.lease_until = lease_until
+        return True
+
+    def _purge_batches(self, db: Database, collection_name: str, filter: dict) -> int | None:
+        '''
+        Delete documents matching `filter` in batches of `batch_size`.
+        Returns number of deleted documents, `None` if stopped or the lease was lost before finishing.
+        '''
+        deleted = 0
+        while True:
+            ids = [
+                document['_id']
+                for document in db[collection_name].find(filter, {'_id': True}, limit=self.config.batch_size)
+            ]
+            if not ids:
+                return deleted
+
+            if not self._hold_lease(db):
+                return None
+            deleted += db[collection_name].delete_many({'_id': {'$in': ids}}).deleted_count
+
+            if len(ids) < self.config.batch_size:
+                return deleted
+
+            if self._pause():
+                return None
+
+    def purge_post(self, db: Database, post: dict) -> bool:
+        for collection_name in DEPENDENTS:
+            deleted = self._purge_batches(db, collection_name, {'post_id': post['_id']})
+            if deleted is None:
+                return False
+
+            if deleted:
+                db['posts'].update_one({'_id': post['_id']}, {'$inc': {f'purged.{collection_name}': deleted}})
+                self._count('documents_purged', deleted)
+
+        if not self._hold_lease(db):
+            return False
+        db['posts'].delete_one({'_id': post['_id'], 'deleted_at': {'$ne': None}})
+        self._count('posts_purged')
+        log.info(f"Purged post {post['_id']} deleted at {post['deleted_at']}")
+        return True
+
+    def purge_posts(self, db: Database) -> int:
+        '''
+        Purge every soft-deleted post, oldest deletions first.
+        '''
+        purged = 0
+        while not self.stop_event.is_set():
+            posts = list(db['posts'].find(
+                {'deleted_at': {'$lte': datetime.utcnow()}},
+                {'_id': True, 'deleted_at': True},
+                sort=[('deleted_at', 1)],
+                limit=self.config.batch_size
+            ))
+            for post in posts:
+                if not self.purge_post(db, post):
+                    return purged
+                purged += 1
+
+            if len(posts) < self.config.batch_size:
+                break
+        return purged
+
+    def _sweep_batch(self, db: Database, collection_name: str, after: ObjectId | None) -> tuple[int, int, ObjectId | None] | None:
+        '''
+        Check the next `batch_size` documents after `after` in `_id` order.
+        Returns numbers of scanned and deleted documents and the last scanned `_id` (`None` at the end),
+        `None` if the lease was lost.
+        '''
+        filter = {'_id': {'$gt': after}} if after else {}
+        documents = list(db[collection_name].find(
+            filter, {'post_id': True}, sort=[('_id', 1)], limit=self.config.batch_size
+        ))
+        if not documents:
+            return 0, 0, None
+
+        post_ids = {document['post_id'] for document in documents if document.get('post_id')}
+        existing = {post['_id'] for post in db['posts'].find({'_id': {'$in': list(post_ids)}}, {'_id': True})}
+        orphans = [
+            document['_id'] for document in documents
+            if document.get('post_id') and document['post_id'] not in existing
+        ]
+
+        deleted = 0
+        if orphans:
+            if not self._hold_lease(db):
+                return None
+            deleted = db[collection_name].delete_many({'_id': {'$in': orphans}}).deleted_count
+
+        last_id = documents[-1]['_id'] if len(documents) == self.config.batch_size else None
+        return len(documents), deleted, last_id
+
+    def sweep_orphans(self, db: Database) -> dict[str, int]:
+        '''
+        Delete documents referencing posts which do not exist anymore,
+        left behind e.g. by deletions from before soft deletion or by interrupted writes.
+        Scans at most `sweep_max_documents` per collection, the next sweep continues from there.
+        '''
+        progress = (db['jobs'].find_one({'_id': 'purge'}, {'sweep': True}) or {}).get('sweep') or {}
+
+        swept = {}
+        for collection_name in DEPENDENTS:
+            swept[collection_name] = 0
+            after = progress.get(collection_name)
+            scanned = 0
+            while scanned < self.config.sweep_max_documents:
+                result = self._sweep_batch(db, collection_name, after)
+                if result is None:
+                    return swept
+                count, deleted, after = result
+                scanned += count
+                swept[collection_name] += deleted
+                db['jobs'].update_one(
+                    {'_id': 'purge', 'owner': self.owner},
+                    {'$set': {f'sweep.{collection_name}': after}}
+                )
+                if after is None or self._pause():
+                    break
+            if self.stop_event.is_set():
+                break
+
+        self._count('orphans_purged', sum(swept.values()))
+        with self.lock:
+            self.last_sweep = datetime.utcnow()
+        if any(swept.values()):
+            log.info(f'Swept orphans: {swept}')
+        return swept
+
+    def run_once(self, db: Database) -> None:
+        if not self._acquire_lease(db):
+            return
+
+        self.purge_posts(db)
+        if self.lease_until is None:
+            return
+
+        sweep_due = self.last_sweep is None or \
+            datetime.utcnow() - self.last_sweep >= timedelta(seconds=self.config.sweep_interval_seconds)
+        if sweep_due and not self.stop_event.is_set():
+            self.sweep_orphans(db)
+
+    def _run(self) -> None:
+        from . import MongoDBConnect
+
+        while not self.stop_event.is_set():
+            try:
+                self.run_once(MongoDBConnect().db)
+            except PyMongoError as e:
+                self._count('errors')
+                log.error(f'Purge run failed: {e}')
+
+            self.wake_event.wait(self.config.interval_seconds)
+            self.wake_event.clear()
+
+    def wake(self) -> None:
+        '''
+        Start the next run without waiting for `interval_seconds`.
+        '''
+        self.wake_event.set()
+
+    def start(self) -> None:
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = Thread(target=self._run, name='post-purger', daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread:
+            self.thread.join(timeout=self.config.interval_seconds)
+
+
+purger = PostPurger(PURGE)
+
+
+def main(argv: list[str] | None = None) -> int:
+    from . import MongoDBConnect
+
+    parser = argparse.ArgumentParser(description='Purge soft-deleted posts and orphaned documents')
+    parser.add_argument('job', choices=['posts', 'orphans'])
+    args = parser.parse_args(argv)
+
+    db = MongoDBConnect().db
+    if not purger._acquire_lease(db):
+        print('Purge lease is held by another process', file=sys.stderr)
+        return 1
+
+    if args.job == 'posts':
+        result = {'purged': purger.purge_posts(db)}
+    else:
+        result = purger.sweep_orphans(db)
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,30 @@
 import logging
 from datetime import datetime
+from typing import Iterator
 from bson.errors import InvalidId
 
 from bson.objectid import ObjectId
 from bson.binary import Binary
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from . import MongoDBConnect
+from .cache import authors, post_fragments
+from .purge import purger
+from .indexes import has_unique_user_indexes
+from .autocomplete import AUTOCOMPLETE_LIMIT, usernames, normalise_username, prefix_range
+from ..utils.cursor import keyset_filter, score_keyset_filter
+from ..utils.search import text_search
 
 log = logging.getLogger('QUERIES')
 
+REACTION_TYPES = ('good', 'heart', 'haha', 'wow', 'p', 'cry')
+
+EXPORT_SECTIONS = ('scans', 'posts', 'comments')
+
+# set once the unique user indexes are found, until then signup looks duplicates up itself
+_unique_user_indexes = False
+
 
 class Queries(MongoDBConnect):
 
@@ -21,8 +37,8 @@ class Queries(MongoDBConnect):
                 'email': True,
                 'profile_picture_url': True,
                 'location': True,
-                'posts': True,
-                'scans': True,
+                'posts_count': True,
+                'scans_count': True,
                 'is_premium': True,
                 'is_private': True,
                 'phone': True
@@ -45,8 +61,8 @@ class Queries(MongoDBConnect):
                 'is_premium': True,
                 'is_private': True,
                 'phone': True,
-                'posts': True,
-                'scans': True
+                'posts_count': True,
+                'scans_count': True
             }
             user = self.find_one('users', filter, projection)
             if user:
@@ -59,34 +75,49 @@ class Queries(MongoDBConnect):
     def update_user_by_id(self, id: str, updates: dict) -> bool:
         try:
             filter = {'_id': ObjectId(id)}
-            update = {'$set': updates}
+            update = {'$set': updates, '$inc': {'version': 1}}
 
             result = self.update_one('users', filter, update)
+            authors.invalidate(id)
             return result.modified_count > 0
         except Exception as e:
             log.error(f'Error updating user: {e}')
             return False
 
-    def search_users_by_username(self, partial_username: str):
+    def _usernames_after(self, last_id: ObjectId | None, limit: int) -> list[dict]:
+        filter = {'_id': {'$gt': last_id}} if last_id else {}
+        return self.find('users', filter, {'username_lower': True}, sort=[('_id', 1)], limit=limit)
+
+    def search_users_by_username(self, partial_username: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[dict]:
+        """
+        Users whose username starts with `partial_username` (case insensitive), in username order.
+        Served from the in-memory autocomplete array, or by the `username_lower` index range when it is disabled.
+        """
         try:
-            filter = {
-                'username': {
-                    '$regex': f'^{partial_username}',
-                    '$options': 'i'
+            prefix = normalise_username(partial_username)
+            if not prefix:
+                return []
+            limit = min(limit, AUTOCOMPLETE_LIMIT)
+
+            ids = usernames.search(prefix, limit, self._usernames_after)
+            if ids is None:
+                lower, upper = prefix_range(prefix)
+                filter = {'username_lower': {'$gte': lower, '$lt': upper}}
+                users = self.find('users', filter, {'_id': True}, sort=[('username_lower', 1)], limit=limit)
+                ids = [str(user['_id']) for user in users]
+
+            summaries = self.get_authors(ids)
+            return [
+                {
+                    'username': summaries[id]['username'],
+                    'profile_picture_url': summaries[id]['image']
                 }
-            }
-            projection = {
-                '_id': False,
-                'username': True,
-                'profile_picture_url': True
-            }
-            users = list(self.db['users'].find(filter, projection))
-            return users
+                for id in ids if id in summaries
+            ]
         except Exception as e:
             log.debug(f'Error fetching users: {e}')
             return []
 
-        
     def get_user_password_by_username(self, username: str) -> dict:
         try:
             filter = {'username': username}
@@ -107,14 +138,24 @@ class Queries(MongoDBConnect):
             log.error(f'Error fetching user: {e}')
             return {}
     
-    def get_post_by_id(self, id: str) -> dict:
+    def get_post_by_id(self, id: str, projection: dict | None = None) -> dict:
         try:
-            filter = {'_id': ObjectId(id)}
-            return self.find_one('posts', filter)
+            filter = {'_id': ObjectId(id), 'deleted_at': None}
+            return self.find_one('posts', filter, projection)
         except Exception as e:
             log.error(f'Error fetching post: {e}')
             return {}
     
+    def get_user_version(self, filter: dict) -> dict | None:
+        """
+        `_id` and `version` of the user matching `filter`, bumped on every change of the profile.
+        """
+        try:
+            return self.find_one('users', filter, {'version': True})
+        except Exception as e:
+            log.error(f'Error fetching user version: {e}')
+            return None
+
     def get_comment_by_id(self, id: str) -> dict:
         try:
             filter = {'_id': ObjectId(id)}
@@ -123,216 +164,100 @@ class Queries(MongoDBConnect):
             log.error(f'Error fetching post: {e}')
             return {}
     
-    def get_notifications(self, user_id: str, last_timestamp: datetime | None, quantity: int) -> list[dict] | bool:
+    def get_authors(self, ids: list[str | ObjectId]) -> dict[str, dict]:
+        """
+        Summaries of users (id, username, image) served from the in-process cache,
+        misses are fetched with a single `$in` query.
+        :param ids: IDs of users
+        :return: Dictionary of summaries by user ID
+        """
+        def load(missing_ids: list[str]) -> list[dict]:
+            filter = {'_id': {'$in': [ObjectId(id) for id in missing_ids]}}
+            projection = {'username': True, 'profile_picture_url': True}
+            return self.find('users', filter, projection)
+
         try:
-            scans_filter = {
-                'user_id': ObjectId(user_id),
-                'is_notification': True
-            }
-            filter = {
-                'is_notification': True
-            }
+            return authors.get_many(ids, load)
+        except Exception as e:
+            log.error(f'Error fetching authors: {e}')
+            return {}
 
-            if last_timestamp:
-                timestamp_filter = {'timestamp': {"$lt": last_timestamp}}
-                scans_filter.update(timestamp_filter)
-                filter.update(timestamp_filter)
+    def get_author(self, id: str | ObjectId) -> dict:
+        return self.get_authors([id]).get(str(id), {})
 
-            pipeline = [
-                {"$match": {"user_id": ObjectId(user_id)}},
-                {"$project": {
-                    "_id": 1
-                }},
-                {"$lookup": {
-                    "from": "comments",
-                    "localField": "_id",
-                    "foreignField": "post_id",
-                    "pipeline": [
-                        {"$match": filter},
-                        {"$project": {
-                            "_id": 1,
-                            "post_id": 1,
-                            "user_id": 1,
-                            "timestamp": 1
-                        }}
-                    ],
-                    "as": "comments"
-                }},
-                
-                {"$lookup": {
-                    "from": "reactions",
-                    "localField": "_id",
-                    "foreignField": "post_id",
-                    "pipeline": [
-                        {"$match": filter},
-                        {"$project": {
-                            "_id": 1,
-                            "post_id": 1,
-                            "user_id": 1,
-                            "reaction_type": 1,
-                            "timestamp": 1
-                        }}
-                    ],
-                    "as": "reactions"
-                }},
-                
-                {"$project": {
-                    "notifications": {
-                        "$concatArrays": [
-                            {"$ifNull": ["$comments", []]},
-                            {"$ifNull": ["$reactions", []]}
-                        ]
-                    }
-                }},
-                
-                {"$unwind": {"path": "$notifications", "preserveNullAndEmptyArrays": True}},
-                
-                {"$replaceRoot": {
-                    "newRoot": {
-                        "$ifNull": ["$notifications", {}]
-                    }
-                }},
-                
-                {"$unionWith": {
-                    "coll": "scans",
-                    "pipeline": [
-                        {"$match": scans_filter},
-                        {"$project": {
-                            "city": 1,
-                            "latitude": 1,
-                            "longitude": 1,
-                            "timestamp": 1
-                        }}
-                    ]
-                }},
-
-                {"$addFields": {
-                    "user_id_object": {"$toObjectId": "$user_id"}
-                }},
-                {"$lookup": {
-                    "from": "users",
-                    "localField": "user_id_object",
-                    "foreignField": "_id",
-                    "as": "user_info"
-                }},
-                {"$unwind": {
-                    "path": "$user_info",
-                    "preserveNullAndEmptyArrays": True 
-                }},
-                {"$addFields": {
-                    "username": "$user_info.username"
-                }},
-                {"$project": {
-                    "user_info": 0,
-                    "user_id_object": 0
-                }},
-
-                {"$sort": {"timestamp": -1}},
-                {"$addFields": {
-                    "timestamp": {
-                        "$dateToString": {
-                            "format": "%Y-%m-%d %H:%M:%S",
-                            "date": "$timestamp"
-                        }
-                    }
-                }},
-                {"$match": {
-                    "timestamp": {"$ne": None}
-                }},
-                {"$limit": quantity}
-            ]
+    def _attach_authors(self, items: list[dict]) -> list[dict]:
+        """
+        Replace `user_id` of posts or comments with the author summary as `user`.
+        """
+        summaries = self.get_authors([item.get('user_id') for item in items])
+        for item in items:
+            user_id = item.pop('user_id', None)
+            item['user'] = summaries.get(str(user_id), {})
+        return items
 
-            return self.find_aggregate('posts', pipeline)
+    def get_notifications(self, user_id: str, last_timestamp: datetime | None, quantity: int, cursor: tuple[datetime, ObjectId] | None = None) -> list[dict] | bool:
+        try:
+            filter = {'owner_id': ObjectId(user_id)}
+
+            if cursor:
+                filter.update(keyset_filter(cursor))
+            elif last_timestamp:
+                filter['timestamp'] = {'$lt': last_timestamp}
+
+            return self.find(
+                'notifications',
+                filter,
+                sort=[('timestamp', -1), ('_id', -1)],
+                limit=quantity
+            )
 
         except Exception as e:
             log.error(f'Error fetching notifications: {e}')
             return False
 
-    def search_posts(self, search_term: str) -> list:
+    def _insert_notification(self, notification_id: ObjectId, owner_id: str | ObjectId, notification_type: str, timestamp: datetime, data: dict) -> None:
+        """
+        Write (or overwrite) the entry of owner's notification inbox.
+        The inbox entry shares `_id` with the comment, reaction or scan it was created for.
+        """
+        document = {
+            '_id': notification_id,
+            'owner_id': ObjectId(owner_id),
+            'notification_type': notification_type,
+            'timestamp': timestamp,
+            **data
+        }
+        self.replace_one('notifications', {'_id': notification_id}, document, upsert=True)
+
+    def search_posts(self, search_term: str, limit: int = 10, cursor: tuple[float, ObjectId, int] | None = None) -> list[dict] | bool:
+        """
+        Full-text search over post descriptions backed by the `description_text` index,
+        ranked by relevance with ties broken by `_id`. Posts are rendered from `post_fragments`
+        by the caller, so only the fields of `probe_posts` are returned, plus the relevance `score`.
+        :param search_term: Words to search for, operators of `$text` are stripped
+        :param limit: Maximum number of documents to return
+        :param cursor: Decoded `(score, _id, offset)` of the last result of the previous page
+        :return: List of matched posts
+        """
         try:
-            query = {"description": {"$regex": search_term, "$options": "i"}}
+            terms = text_search(search_term)
+            if not terms:
+                return []
 
             pipeline = [
-                {"$match": query},
-                {"$sort": {"timestamp": -1}},
-                {
-                    "$lookup": {
-                        "from": "reactions",
-                        "localField": "_id",
-                        "foreignField": "post_id",
-                        "as": "reactions",
-                    }
-                },
-                {
-                    "$lookup": {
-                        "from": "users",
-                        "localField": "user_id",
-                        "foreignField": "_id",
-                        "as": "user",
-                    }
-                },
-                {"$unwind": {"path": "$user", "preserveNullAndEmptyArrays": True}},
-                {
-                    "$project": {
-                        "id": {"$toString": "$_id"},
-                        "content": "$description",
-                        "images": "$images_urls",
-                        "user": {
-                            "id": {"$toString": "$user._id"},
-                            "username": "$user.username",
-                            "image": "$user.profile_picture_url",
-                        },
-                        "location": 1,
-                        "timestamp": {
-                            "$dateToString": {
-                                "format": "%Y-%m-%dT%H:%M:%S.%LZ",
-                                "date": "$timestamp",
-                                "timezone": "UTC"
-                            }
-                        },
-                        "reactions": {
-                            "$map": {
-                                "input": "$reactions",
-                                "as": "reaction",
-                                "in": {
-                                    "id": {"$toString": "$$reaction._id"},
-                                    "user_id": {"$toString": "$$reaction.user_id"},
-                                    "reaction_type": "$$reaction.reaction_type",
-                                },
-                            }
-                        },
-                    }
-                },
+                {"$match": {"$text": {"$search": terms}, "deleted_at": None}},
+                {"$project": {"score": {"$meta": "textScore"}, "user_id": 1, "version": 1, "timestamp": 1}},
+                *([{"$match": score_keyset_filter(cursor)}] if cursor else []),
+                {"$sort": {"score": -1, "_id": -1}},
+                {"$limit": limit},
             ]
 
-            cursor = self.find_aggregate('posts', pipeline)
-
-            processed_results = []
-            for post in cursor:
-                try:
-                    processed_results.append({
-                        'id': post.get('id', ''),
-                        'content': post.get('content', ''),
-                        'images': post.get('images', []),
-                        'user': {
-                            'id': post.get('user', {}).get('id', ''),
-                            'username': post.get('user', {}).get('username', ''),
-                            'image': post.get('user', {}).get('image', '')
-                        },
-                        'location': post.get('location', ''),
-                        'timestamp': post.get('timestamp', ''),
-                        'reactions': post.get('reactions', [])
-                    })
-                except Exception as e:
-                    log.error(f"Error processing post: {e}")
-
-            return processed_results
+            return self.find_aggregate('posts', pipeline)
 
         except Exception as e:
             log.error(f"Error searching posts: {e}")
             return False
 
-    
     def user_change_password(self, _id: ObjectId, hashed_password: bytes) -> bool:
         try:
             hashed_password_binary = Binary(hashed_password)
@@ -352,29 +277,52 @@ class Queries(MongoDBConnect):
             log.error(f'Error updating user: {e}')
             return False
             
+    def _check_unique_user(self, username: str, email: str) -> None:
+        """
+        Reject a taken username or email the way the unique indexes do, while they are missing.
+        Unlike the indexes, these lookups leave a window for concurrent duplicate signups.
+        """
+        global _unique_user_indexes
+        if _unique_user_indexes:
+            return
+        if has_unique_user_indexes(self.db):
+            _unique_user_indexes = True
+            return
+
+        log.warning('Unique indexes of users are missing, checking signup duplicates with lookups')
+        if self.get_user_by_username(username):
+            raise DuplicateKeyError('Username already exists', 11000, {'keyPattern': {'username': 1}})
+        if self.get_user_by_email(email):
+            raise DuplicateKeyError('Email already exists', 11000, {'keyPattern': {'email': 1}})
+
     def create_user(self, username: str, email: str, hashed_password: bytes, phone: str):
         try:
+            self._check_unique_user(username, email)
             user_data = {
                 'username': username,
+                'username_lower': normalise_username(username),
                 'email': email,
                 'hashed_password': hashed_password,
                 'phone': phone,
                 'profile_picture_url': "",
                 'bio': "",
-                'scans': [],
-                'posts': [],
+                'scans_count': 0,
+                'posts_count': 0,
                 'location': "",
                 'is_premium': False,
                 'is_private': False,
             }
             result = self.insert_one('users', user_data)
+            usernames.add(result.inserted_id, username)
             return result.inserted_id
+        except DuplicateKeyError:
+            # username or email taken, the caller tells them apart by `keyPattern`
+            raise
         except Exception as e:
             log.error(f'Error creating user: {e}')
             return False
 
-    @MongoDBConnect.transaction
-    def insert_scan(self, user_id: str, ip: str, city: str, latitude: float, longitude: float, timestamp: datetime, session=None) -> str | bool:
+    def insert_scan(self, user_id: str, ip: str, city: str, latitude: float, longitude: float, timestamp: datetime) -> str | bool:
         try:
             document = {
                 'user_id': ObjectId(user_id), 
@@ -382,8 +330,7 @@ class Queries(MongoDBConnect):
                 'city': city, 
                 'latitude': latitude, 
                 'longitude': longitude, 
-                'timestamp': timestamp,
-                'is_notification': True
+                'timestamp': timestamp
             }
             result = self.insert_one('scans', document)
             
@@ -392,13 +339,20 @@ class Queries(MongoDBConnect):
             update_result = self.update_one(
                 'users',
                 {'_id': ObjectId(user_id)},
-                {'$push': {'scans': inserted_id}},
-                session=session
+                {'$inc': {'scans_count': 1, 'version': 1}}
             )
 
             if update_result.modified_count == 0:
                 log.info(f"User with id {user_id} not updated")
                 return False
+
+            self._insert_notification(
+                inserted_id,
+                user_id,
+                'scan',
+                timestamp,
+                {'city': city, 'latitude': latitude, 'longitude': longitude}
+            )
             
             return inserted_id
     
@@ -406,15 +360,13 @@ class Queries(MongoDBConnect):
             log.error(f"Error inserting comment with data {user_id = }, {ip = }, {city = }, {latitude = }, {longitude = } Error: {e}")
             return False
     
-    @MongoDBConnect.transaction
-    def insert_comment(self, post_id: str, user_id: str, content: str, timestamp: datetime, session=None) -> str | bool:
+    def insert_comment(self, post_id: str, user_id: str, content: str, timestamp: datetime, owner_id: str, username: str) -> str | bool:
         try:
             document = {
                 'post_id': ObjectId(post_id), 
                 'user_id': ObjectId(user_id), 
                 'content': content, 
-                'timestamp': timestamp, 
-                'is_notification': True
+                'timestamp': timestamp
             }
             result = self.insert_one('comments', document)
             
@@ -423,13 +375,21 @@ class Queries(MongoDBConnect):
             update_result = self.update_one(
                 'posts',
                 {'_id': ObjectId(post_id)},
-                {'$push': {'comments': inserted_id}},
-                session=session
+                {'$inc': {'comments_count': 1, 'version': 1}}
             )
+            post_fragments.invalidate(post_id)
 
             if update_result.modified_count == 0:
                 log.info(f"Post with id {post_id} not updated")
                 return False
+
+            self._insert_notification(
+                inserted_id,
+                owner_id,
+                'comment',
+                timestamp,
+                {'post_id': ObjectId(post_id), 'user_id': ObjectId(user_id), 'username': username}
+            )
             
             return str(inserted_id)
         
@@ -437,71 +397,71 @@ class Queries(MongoDBConnect):
             log.error(f"Error inserting comment with data {post_id = }, {user_id = }, {content = }, Error: {e}")
             return False
     
-    @MongoDBConnect.transaction
-    def insert_reaction(self, post_id: str, user_id: str, reaction_type: str, timestamp: datetime, session=None) -> str | bool:
+    def insert_reaction(self, post_id: str, user_id: str, reaction_type: str, timestamp: datetime, owner_id: str, username: str) -> str | bool:
+        if reaction_type not in REACTION_TYPES:
+            log.info(f"Unknown {reaction_type = }")
+            return False
+
         try:
-            filter = {
-                'post_id': ObjectId(post_id), 
-                'user_id': ObjectId(user_id), 
-            }
-            find_result = self.find_one('reactions', filter)
-
-            if find_result:
-                if find_result.get('reaction_type') == reaction_type:
-                    return False
-                
-                inserted_id = str(find_result.get('_id'))
-                update_values = {
-                    '$set': {
-                        'reaction_type': reaction_type, 
-                        'timestamp': timestamp, 
-                        'is_notification': True
-                    }
-                }
-                update_result = self.update_one('reactions', filter, update_values, session=session)
-
-                if update_result.modified_count == 0:
-                    log.info(f"Reaction with id {inserted_id} not updated")
-                    return False
-                
-                return inserted_id
-
-            else:
-                document = {
-                    'post_id': ObjectId(post_id), 
-                    'user_id': ObjectId(user_id), 
-                    'reaction_type': reaction_type, 
-                    'timestamp': timestamp, 
-                    'is_notification': True
-                }
-                result = self.insert_one('reactions', document, session=session)
-
-                inserted_id = result.inserted_id
-
-                update_result = self.update_one(
-                    'posts',
-                    {'_id': ObjectId(post_id)},
-                    {'$push': {'reactions': inserted_id}},
-                    session=session
-                )
-
-                if update_result.modified_count == 0:
-                    log.info(f"Reaction with id {inserted_id} not updated")
-                    return False
-                
-                return str(inserted_id)
-        
+            reaction_id = ObjectId()
+            # matches only a reaction of different type, so an unchanged reaction
+            # falls through to the upsert and is rejected by the unique (post_id, user_id) index
+            previous = self.find_one_and_update(
+                'reactions',
+                {
+                    'post_id': ObjectId(post_id),
+                    'user_id': ObjectId(user_id),
+                    'reaction_type': {'$ne': reaction_type}
+                },
+                {
+                    '$set': {'reaction_type': reaction_type, 'timestamp': timestamp},
+                    '$setOnInsert': {'_id': reaction_id}
+                },
+                projection={'reaction_type': True},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            log.info(f"Reaction {reaction_type} already set for {post_id = }, {user_id = }")
+            return False
         except Exception as e:
             log.error(f"Error inserting reaction with data {post_id = }, {user_id = }, {reaction_type = }, Error: {e}")
             return False
 
+        try:
+            increments = {f'reactions_count.{reaction_type}': 1, 'version': 1}
+            if previous:
+                reaction_id = previous['_id']
+                increments[f'reactions_count.{previous["reaction_type"]}'] = -1
+
+            update_result = self.update_one('posts', {'_id': ObjectId(post_id)}, {'$inc': increments})
+            post_fragments.invalidate(post_id)
+
+            if update_result.modified_count == 0:
+                log.info(f"Reactions count of post {post_id} not updated")
+
+            self._insert_notification(
+                reaction_id,
+                owner_id,
+                'reaction',
+                timestamp,
+                {'post_id': ObjectId(post_id), 'user_id': ObjectId(user_id), 'username': username, 'reaction_type': reaction_type}
+            )
+
+            return str(reaction_id)
+        
+        except Exception as e:
+            log.error(f"Error updating reaction {reaction_id} side effects for {post_id = }, Error: {e}")
+            return str(reaction_id)
+
     def update_user_picture(self, user_id: str, new_picture_url: str) -> bool:
         try:
             update_result = self.update_one(
                 'users',
                 {'_id': ObjectId(user_id)},
-                {'$set': {'profile_picture_url': new_picture_url}}
+                {'$set': {'profile_picture_url': new_picture_url}, '$inc': {'version': 1}}
             )
+            authors.invalidate(user_id)
 
             if update_result.modified_count == 0:
                 log.info(f"Profile picture not updated for user {user_id}")
@@ -515,36 +475,16 @@ class Queries(MongoDBConnect):
 
     def remove_notification(self, notification_type: str, user_id: str, notification_id: str) -> bool:
         try:
-            if notification_type in {'comment', 'reaction'}:
-                result = self.find_one(f'{notification_type}s', {"_id": ObjectId(notification_id)})
-                
-                if not result:
-                    return False
-
-                post_result = self.find_one(f'posts', {"_id": result.get('post_id')})
-
-                if not post_result or str(post_result.get('user_id')) != user_id:
-                    return False
-                
-                delete_result = self.update_one(
-                    f'{notification_type}s',
-                    {
-                        "_id": ObjectId(notification_id)
-                    },
-                    {'$set': {'is_notification': False}}
-                )
-
-            else:
-                delete_result = self.update_one(
-                    f'{notification_type}s',
-                    {
-                        "user_id": ObjectId(user_id),
-                        "_id": ObjectId(notification_id)
-                    },
-                    {'$set': {'is_notification': False}}
-                )
+            delete_result = self.delete_one(
+                'notifications',
+                {
+                    '_id': ObjectId(notification_id),
+                    'owner_id': ObjectId(user_id),
+                    'notification_type': notification_type
+                }
+            )
             
-            if delete_result.modified_count == 0:
+            if delete_result.deleted_count == 0:
                 log.info(f"Notification not removed for {user_id}, {notification_id = }")
                 return False
 
@@ -554,15 +494,13 @@ class Queries(MongoDBConnect):
             log.error(f"Error during removing notification: {notification_id = }, {user_id = }, Error = {e}")
             return False
     
-    @MongoDBConnect.transaction
-    def delete_comment(self, comment_id: str, session=None) -> bool:
+    def delete_comment(self, comment_id: str) -> bool:
         try:
             delete_result = self.find_one_and_delete(
                 'comments',
                 {
                     "_id": ObjectId(comment_id)
-                },
-                session=session
+                }
             )
             
             if not delete_result:
@@ -572,13 +510,15 @@ class Queries(MongoDBConnect):
             update_result = self.update_one(
                 'posts',
                 {'_id': delete_result.get('post_id')},
-                {'$pull': {'comments': delete_result.get('_id')}},
-                session=session
+                {'$inc': {'comments_count': -1, 'version': 1}}
             )
+            post_fragments.invalidate(delete_result.get('post_id'))
 
             if update_result.modified_count == 0:
                 log.info(f"Comment not removed from post {delete_result.get('post_id')}, {comment_id = }")
                 return False
+
+            self.delete_one('notifications', {'_id': delete_result.get('_id')})
             
             return True
         
@@ -586,16 +526,14 @@ class Queries(MongoDBConnect):
             log.error(f"Error during deleting comment: {comment_id = }, Error = {e}")
             return False
     
-    @MongoDBConnect.transaction
-    def delete_reaction(self, user_id: str, post_id: str, session=None) -> bool:
+    def delete_reaction(self, user_id: str, post_id: str) -> bool:
         try:
             delete_result = self.find_one_and_delete(
                 'reactions',
                 {
                     'user_id': ObjectId(user_id),
                     'post_id': ObjectId(post_id)
-                },
-                session=session
+                }
             )
             
             if not delete_result:
@@ -605,13 +543,15 @@ class Queries(MongoDBConnect):
             update_result = self.update_one(
                 'posts',
                 {'_id': ObjectId(post_id)},
-                {'$pull': {'reactions': delete_result.get('_id')}},
-                session=session
+                {'$inc': {f'reactions_count.{delete_result.get("reaction_type")}': -1, 'version': 1}}
             )
+            post_fragments.invalidate(post_id)
 
             if update_result.modified_count == 0:
                 log.info(f"Reaction not removed from post for {user_id = }, {post_id = }")
                 return False
+
+            self.delete_one('notifications', {'_id': delete_result.get('_id')})
             
             return True
         
@@ -619,73 +559,98 @@ class Queries(MongoDBConnect):
             log.error(f"Error during deleting reaction for {user_id = }, {post_id = }, Error = {e}")
             return False
         
-    def fetch_posts(self, query: dict, limit: int = 10) -> list:
+    def _user_reaction_lookup(self, viewer_id: str | None) -> list[dict]:
+        """
+        Pipeline stages joining only the viewer's own reaction (at most one, via unique index) as `user_reaction`.
+        :param viewer_id: ID of the user viewing posts, None for anonymous viewer
+        :return: List of aggregation stages
+        """
+        if not viewer_id:
+            return []
+
+        return [
+            {
+                "$lookup": {
+                    "from": "reactions",
+                    "localField": "_id",
+                    "foreignField": "post_id",
+                    "pipeline": [
+                        {"$match": {"user_id": ObjectId(viewer_id)}},
+                        {"$project": {"_id": 0, "reaction_type": 1}},
+                    ],
+                    "as": "user_reaction",
+                }
+            },
+        ]
+
+    def probe_posts(self, query: dict, limit: int = 10) -> list[dict]:
+        """
+        Cheap counterpart of `fetch_posts` returning only `_id`, `user_id`, `version` and `timestamp`
+        of the same page, used to validate ETags and to look up cached post fragments
+        before the aggregation runs.
+        """
+        try:
+            return self.find(
+                'posts',
+                {**query, 'deleted_at': None},
+                {'user_id': True, 'version': True, 'timestamp': True},
+                sort=[('timestamp', -1), ('_id', -1)],
+                limit=limit
+            )
+        except Exception as e:
+            log.error(f"Error probing posts: {e}")
+            return []
+
+    def get_user_reactions(self, user_id: str, post_ids: list[ObjectId]) -> dict[str, str]:
+        """
+        Reaction types given by the user to the posts, by post ID.
+        """
+        try:
+            reactions = self.find(
+                'reactions',
+                {'post_id': {'$in': post_ids}, 'user_id': ObjectId(user_id)},
+                {'_id': False, 'post_id': True, 'reaction_type': True}
+            )
+            return {str(reaction['post_id']): reaction['reaction_type'] for reaction in reactions}
+        except Exception as e:
+            log.error(f"Error fetching reactions of user {user_id}: {e}")
+            return {}
+
+    def fetch_posts(self, query: dict, limit: int = 10, viewer_id: str | None = None) -> list:
         """
         Fetch posts from the database with optional filters and pagination using aggregation pipeline.
-        This version includes related reactions and user details using $lookup.
+        Reactions are returned as per-type counters maintained on the post plus the viewer's own reaction.
         :param query: Dictionary containing query filters
         :param limit: Maximum number of documents to return
+        :param viewer_id: ID of the user viewing posts, None for anonymous viewer
         :return: List of posts
         """
         try:
             # Build the aggregation pipeline
             pipeline = [
-                # Match posts based on the query
-                {"$match": query},
+                # Match posts based on the query, skipping soft-deleted ones
+                {"$match": {**query, "deleted_at": None}},
 
-                # Sort by timestamp in descending order
-                {"$sort": {"timestamp": -1}},
+                # Sort by timestamp in descending order, _id breaks ties for keyset pagination
+                {"$sort": {"timestamp": -1, "_id": -1}},
 
                 # Limit the number of posts
                 {"$limit": limit},
 
-                # Lookup reactions for each post
-                {
-                    "$lookup": {
-                        "from": "reactions",             # Collection to join
-                        "localField": "_id",             # Field from the 'posts' collection
-                        "foreignField": "post_id",       # Field from the 'reactions' collection
-                        "as": "reactions",               # Output array field
-                    }
-                },
+                # Lookup the viewer's own reaction for each post
+                *self._user_reaction_lookup(viewer_id),
 
-                # Lookup user details for the post author
-                {
-                    "$lookup": {
-                        "from": "users",                 # Collection to join
-                        "localField": "user_id",         # Field from the 'posts' collection
-                        "foreignField": "_id",           # Field from the 'users' collection
-                        "as": "user",                    # Output array field
-                    }
-                },
-
-                # Unwind the user array to convert it to a single object
-                {"$unwind": {"path": "$user", "preserveNullAndEmptyArrays": True}},
-
-                # Project fields to format the output structure
+                # Project fields to format the output structure, authors are resolved from cache
                 {
                     "$project": {
                         "id": {"$toString": "$_id"},     # Convert ObjectId to string
                         "content": "$description",      # Rename field
                         "images": "$images_urls",       # Rename field
-                        "user": {
-                            "id": {"$toString": "$user._id"},
-                            "username": "$user.username",
-                            "image": "$user.profile_picture_url",
-                        },
+                        "user_id": 1,
                         "location": 1,
                         "timestamp": 1,
-                        "reactions": {
-                            "$map": {
-                                "input": "$reactions",
-                                "as": "reaction",
-                                "in": {
-                                    "id": {"$toString": "$$reaction._id"},
-                                    "user_id": {"$toString": "$$reaction.user_id"},
-                                    "reaction_type": "$$reaction.reaction_type",
-                                },
-                            }
-                        },
+                        "reactions_count": {"$ifNull": ["$reactions_count", {}]},
+                        "user_reaction": {"$arrayElemAt": ["$user_reaction.reaction_type", 0]},
                     }
                 },
             ]
@@ -693,7 +658,7 @@ class Queries(MongoDBConnect):
             # Execute the aggregation pipeline
             cursor = self.find_aggregate('posts', pipeline)
 
-            return list(cursor)
+            return self._attach_authors(cursor)
 
         except Exception as e:
             log.error(f"Error fetching posts with $lookup: {e}")
@@ -731,36 +696,19 @@ class Queries(MongoDBConnect):
                 # Match comments based on the query
                 {"$match": query},
 
-                # Sort by timestamp in descending order
-                {"$sort": {"timestamp": -1}},
+                # Sort by timestamp in descending order, _id breaks ties for keyset pagination
+                {"$sort": {"timestamp": -1, "_id": -1}},
 
                 # Limit the number of comments
                 {"$limit": limit},
 
-                # Lookup user details for each comment's user
-                {
-                    "$lookup": {
-                        "from": "users",                # Collection to join
-                        "localField": "user_id",        # Field from the 'comments' collection
-                        "foreignField": "_id",          # Field from the 'users' collection
-                        "as": "user",                   # Output array field
-                    }
-                },
-
-                # Unwind the user array to convert it to a single object
-                {"$unwind": {"path": "$user", "preserveNullAndEmptyArrays": True}},
-
-                # Project fields to format the output structure
+                # Project fields to format the output structure, authors are resolved from cache
                 {
                     "$project": {
                         "id": {"$toString": "$_id"},     # Convert ObjectId to string
                         "content": 1,
                         "timestamp": 1,
-                        "user": {
-                            "id": {"$toString": "$user._id"},
-                            "username": "$user.username",
-                            "image": "$user.profile_picture_url",
-                        },
+                        "user_id": 1,
                     }
                 },
             ]
@@ -768,7 +716,7 @@ class Queries(MongoDBConnect):
             # Execute the aggregation pipeline
             cursor = self.find_aggregate('comments', pipeline)
 
-            return list(cursor)
+            return self._attach_authors(cursor)
 
         except Exception as e:
             log.error(f"Error fetching comments: {e}")
@@ -786,7 +734,7 @@ class Queries(MongoDBConnect):
             update_result = self.update_one(
                 'users',  
                 {'_id': post_data.get("user_id")},  
-                {'$push': {'posts': ObjectId(post_id)}}  
+                {'$inc': {'posts_count': 1, 'version': 1}}
             )
             if update_result.modified_count == 0:
                 log.warning(f"User document was not updated for user_id: {post_data.get("user_id")}")
@@ -796,33 +744,54 @@ class Queries(MongoDBConnect):
             return None
         
     def delete_post(self, post_id: str, user_id: str) -> bool:
+        """
+        Soft-delete the post of given owner. The post disappears from reads immediately,
+        its comments, reactions and notifications are purged in background by `purger`.
+        """
         try:
-            # Delete the post
-            delete_result = self.delete_one('posts', {'_id': ObjectId(post_id)})
-            if delete_result.deleted_count == 0:
-                log.info(f"No post found with id {post_id} to delete")
+            update_result = self.update_one(
+                'posts',
+                {'_id': ObjectId(post_id), 'user_id': ObjectId(user_id), 'deleted_at': None},
+                {'$set': {'deleted_at': datetime.utcnow()}, '$inc': {'version': 1}}
+            )
+            post_fragments.invalidate(post_id)
+            if update_result.modified_count == 0:
+                log.info(f"No post found with id {post_id} of user {user_id} to delete")
                 return False
 
-            # Remove the post reference from the user's posts array
-            update_result = self.update_one(
+            # Decrease the user's posts counter
+            self.update_one(
                 'users',
                 {'_id': ObjectId(user_id)},
-                {'$pull': {'posts': ObjectId(post_id)}}
+                {'$inc': {'posts_count': -1, 'version': 1}}
             )
 
-            # Delete all reactions associated with the post
-            reactions_delete_result = self.delete_many('reactions', {'post_id': ObjectId(post_id)})
-            log.info(f"Deleted {reactions_delete_result.deleted_count} reactions for post {post_id}")
-
-            # Delete all comments associated with the post
-            comments_delete_result = self.delete_many('comments', {'post_id': ObjectId(post_id)})
-            log.info(f"Deleted {comments_delete_result.deleted_count} comments for post {post_id}")
-
-            # Return true if the post and related data were successfully deleted
-            return update_result.modified_count > 0
+            purger.wake()
+            return True
 
         except Exception as e:
             log.error(f"Error deleting post: {e}")
             return False
 
-
+    def export_user(self, user_id: str, sections: tuple[str, ...] = EXPORT_SECTIONS) -> Iterator[dict]:
+        """
+        Stream the user's own scans, posts and comments, oldest first within each section.
+        Documents are read batch by batch, so memory use does not grow with the history.
+        :param user_id: ID of the exported user
+        :param sections: Subset of `EXPORT_SECTIONS` to export
+        :return: Iterator of records tagged with their `type`
+        """
+        exports = {
+            'scans': ('scan', {'user_id': ObjectId(user_id)}, {'city': True, 'latitude': True, 'longitude': True, 'timestamp': True}),
+            'posts': ('post', {'user_id': ObjectId(user_id), 'deleted_at': None}, {
+                'description': True, 'images_urls': True, 'location': True, 'timestamp': True,
+                'comments_count': True, 'reactions_count': True
+            }),
+            'comments': ('comment', {'user_id': ObjectId(user_id)}, {'post_id': True, 'content': True, 'timestamp': True}),
+        }
+
+        for section in sections:
+            type, filter, projection = exports[section]
+            # walks the (user_id, timestamp, _id) index backwards, no collection scan or in-memory sort
+            for document in self.iter_find(section, filter, projection, sort=[('timestamp', 1), ('_id', 1)]):
+                yield {'type': type, 'id': str(document.pop('_id')), **document}
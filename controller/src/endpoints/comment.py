@@ -7,8 +7,9 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson.objectid import ObjectId
 
 from ..database.queries import Queries as db
-from ..utils.request import send_request
-from ..utils.apps import Services
+from ..utils.dispatcher import dispatcher
+from ..utils.cursor import MAX_PAGE_SIZE, decode_cursor, keyset_filter, next_cursor
+from ..utils.serializer import serialize_with
 
 
 log = logging.getLogger('COMMENT')
@@ -38,7 +39,8 @@ comment_model = api.model(
 get_comments_model = api.model(
     'Get comments model', 
     {
-        'comments': fields.List(fields.Nested(comment_model), description="List of comments for a given post")
+        'comments': fields.List(fields.Nested(comment_model), description="List of comments for a given post"),
+        'next_cursor': fields.String(description="Cursor of the next page, null if there are no more comments")
     }
 )
 
@@ -62,8 +64,9 @@ class Comment(Resource):
     @api.doc(
         params={
             'post_id': {'description': 'Unique ID of post to fetch comments from', 'type': str, 'required': True},
-            'last_timestamp': {'description': 'Timestamp of last fetched notification', 'type': str, 'required': False},
-            'limit': {'description': 'Quantity of comments to fetch', 'type': int, 'default': 10, 'required': True},
+            'cursor': {'description': 'Continuation cursor returned as `next_cursor` by the previous page', 'type': str, 'required': False},
+            'last_timestamp': {'description': 'Deprecated, use `cursor`. Timestamp of last fetched comment', 'type': str, 'required': False},
+            'limit': {'description': f'Quantity of comments to fetch (at most {MAX_PAGE_SIZE})', 'type': int, 'default': 10, 'required': True},
             'Authorization': {
                 'description': 'Bearer token for authentication',
                 'required': True,
@@ -72,7 +75,7 @@ class Comment(Resource):
             }
         }
     )
-    @api.marshal_list_with(get_comments_model, code=200)
+    @serialize_with(get_comments_model, as_list=True, code=200)
     @api.response(200, 'OK')
     @api.response(400, 'Bad Request')
     @api.response(401, 'Unauthorized')
@@ -84,8 +87,13 @@ class Comment(Resource):
         '''
         try:
             post_id = request.args.get('post_id')
+            cursor = request.args.get('cursor')
             last_timestamp = request.args.get('last_timestamp')
-            limit = int(request.args.get('limit', 10))
+            limit = request.args.get('limit', 10, type=int)
+            if limit <= 0:
+                log.error(f"Invalid limit: {request.args.get('limit')}")
+                return {"message": "Bad Request: limit must be a positive integer."}, 400
+            limit = min(limit, MAX_PAGE_SIZE)
 
             # Initialize query
             query = {}
@@ -96,7 +104,13 @@ class Comment(Resource):
                     log.error(f"Invalid user_id format: {post_id}")
                     return {"message": "Invalid post_id format."}, 400
 
-            if last_timestamp:
+            if cursor:
+                try:
+                    query.update(keyset_filter(decode_cursor(cursor)))
+                except ValueError:
+                    log.error(f"Invalid cursor: {cursor}")
+                    return {"message": "Invalid cursor."}, 400
+            elif last_timestamp:
                 try:
                     query['timestamp'] = {'$lt': datetime.fromisoformat(last_timestamp)}
                 except ValueError:
@@ -108,7 +122,7 @@ class Comment(Resource):
             comments = db().fetch_comments(query=query, limit=limit)
 
             log.info(f"Comments fetched: {comments}")
-            return {"comments": comments}, 200
+            return {"comments": comments, "next_cursor": next_cursor(comments, limit)}, 200
 
         except Exception as e:
             log.error(f"Error in GET /comments: {e}")
@@ -139,7 +153,7 @@ class Comment(Resource):
         timestamp = datetime.now()
         
         queries = db()
-        user_owner_id = queries.get_post_by_id(post_id).get('user_id')
+        user_owner_id = (queries.get_post_by_id(post_id, {'user_id': True}) or {}).get('user_id')
         
         if not user_owner_id:
             log.info('User owner not found')
@@ -147,13 +161,13 @@ class Comment(Resource):
         
         user_owner_id = str(user_owner_id)
 
-        user = queries.get_user_by_id(user_id)
+        user = queries.get_author(user_id)
         
         if not user:
             log.info('User that commented not found')
             api.abort(404, "User not found")
 
-        comment_id = queries.insert_comment(post_id, user_id, content, timestamp)
+        comment_id = queries.insert_comment(post_id, user_id, content, timestamp, user_owner_id, user.get('username'))
         
         if not comment_id:
             log.error(f'Cannot insert comment for data: {post_id = }, {user_id = }, {content = }')
@@ -166,13 +180,11 @@ class Comment(Resource):
                 'post_id': post_id,
                 'user_id': user_id,
                 'username': user.get('username'),
+            },
             'timestamp': str(timestamp)
-            }
         }
-        try:
-            send_request('POST', Services.NOTIFIER, '/emit/comment', json_data=json_data_notifier)
-        except Exception as e:
-            log.info(f'Error during sending notification for {user_owner_id = } via websocket: {e}')
+        # delivered in the background, the notification is already in the owner's inbox
+        dispatcher.emit('comment', json_data_notifier)
 
         json_data = {
             'id': comment_id,
@@ -181,7 +193,7 @@ class Comment(Resource):
             'user': {
                 'id': user_id,
                 'username': user.get('username'),
-                'image': user.get('profile_picture_url')
+                'image': user.get('image')
             }
         }
         return json_data, 201
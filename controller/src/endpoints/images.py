@@ -0,0 +1,40 @@
+import logging
+
+from flask import request, send_file
+from flask_restx import Resource, Namespace
+
+from ..utils.apps import IMAGES
+from ..utils.image_store import LocalStore, store
+
+
+log = logging.getLogger('IMAGES')
+
+api = Namespace('images')
+
+
+@api.route('/<string:name>')
+class StoredImage(Resource):
+    @api.doc(params={
+        'name': 'Content hash with extension, as in the image URL',
+        'size': 'Minimal width, the smallest stored variant at least this wide is sent',
+    })
+    @api.response(200, 'OK')
+    @api.response(304, 'Not Modified')
+    @api.response(404, 'Image not found')
+    def get(self, name):
+        '''
+        Image kept by the local image store. Stored images never change, so they are cacheable for good.
+        '''
+        if not isinstance(store, LocalStore):
+            api.abort(404, 'Image not found')
+
+        resolved = store.resolve(name, request.args.get('size', type=int))
+        if resolved is None:
+            api.abort(404, 'Image not found')
+
+        path, mimetype = resolved
+        # sent by the WSGI file wrapper (sendfile where the server supports it)
+        response = send_file(path, mimetype=mimetype, max_age=IMAGES.cache_max_age, conditional=True, etag=True)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
@@ -0,0 +1,157 @@
+import logging
+
+from flask_restx import Resource, fields, Namespace
+
+from ..database.monitoring import method_stats, command_stats
+from ..database.cache import authors, post_fragments
+from ..database.autocomplete import usernames
+from ..database.purge import purger
+from ..utils.dispatcher import dispatcher
+from ..utils.qr import qr_codes
+
+
+log = logging.getLogger('METRICS')
+
+api = Namespace('metrics')
+
+
+query_stats_model = api.model(
+    'Query stats model',
+    {
+        'calls': fields.Integer(description='Number of calls'),
+        'total_ms': fields.Float(description='Total latency in milliseconds'),
+        'avg_ms': fields.Float(description='Average latency in milliseconds'),
+        'max_ms': fields.Float(description='Maximal latency in milliseconds'),
+        'n_returned': fields.Integer(description='Documents returned in the first batches'),
+        'slow': fields.Integer(description='Number of calls above the slow query threshold'),
+        'slow_docs_examined': fields.Integer(description='Documents examined by slow calls (from explain)'),
+        'slow_n_returned': fields.Integer(description='Documents returned by slow calls (from explain)'),
+    }
+)
+
+queries_output_model = api.model(
+    'Queries metrics output model',
+    {
+        'methods': fields.Wildcard(fields.Nested(query_stats_model), description='Stats per Queries method'),
+        'commands': fields.Wildcard(fields.Nested(query_stats_model), description='Stats per Queries method and database command'),
+    }
+)
+
+
+@api.route('/queries')
+class QueriesMetrics(Resource):
+    @api.marshal_with(queries_output_model, code=200)
+    @api.response(200, 'OK')
+    def get(self):
+        '''
+        Latency statistics of database queries collected since the process start
+        '''
+        return {
+            'methods': method_stats.snapshot(),
+            'commands': command_stats.snapshot(),
+        }, 200
+
+
+cache_stats_model = api.model(
+    'Cache stats model',
+    {
+        'size': fields.Integer(description='Number of cached entries'),
+        'hits': fields.Integer(description='Number of cache hits'),
+        'misses': fields.Integer(description='Number of cache misses'),
+    }
+)
+
+autocomplete_stats_model = api.model(
+    'Autocomplete stats model',
+    {
+        'size': fields.Integer(description='Number of usernames in the sorted array'),
+        'hot_size': fields.Integer(description='Number of cached prefix answers'),
+        'hot_hits': fields.Integer(description='Number of prefix cache hits'),
+        'hot_misses': fields.Integer(description='Number of prefix cache misses'),
+    }
+)
+
+fragment_stats_model = api.inherit(
+    'Fragment cache stats model',
+    cache_stats_model,
+    {
+        'bytes': fields.Integer(description='Total size of cached fragments in bytes'),
+    }
+)
+
+caches_output_model = api.model(
+    'Caches metrics output model',
+    {
+        'authors': fields.Nested(cache_stats_model, description='Author summaries cache'),
+        'usernames': fields.Nested(autocomplete_stats_model, description='Username autocomplete array and its hot queries cache'),
+        'post_fragments': fields.Nested(fragment_stats_model, description='Serialised posts cache'),
+        'qr_codes': fields.Nested(cache_stats_model, description='Rendered QR codes cache (in memory)'),
+    }
+)
+
+
+@api.route('/caches')
+class CachesMetrics(Resource):
+    @api.marshal_with(caches_output_model, code=200)
+    @api.response(200, 'OK')
+    def get(self):
+        '''
+        Usage statistics of in-process caches
+        '''
+        return {
+            'authors': authors.stats(),
+            'usernames': usernames.stats(),
+            'post_fragments': post_fragments.stats(),
+            'qr_codes': qr_codes.stats(),
+        }, 200
+
+
+purge_stats_model = api.model(
+    'Purge stats model',
+    {
+        'posts_purged': fields.Integer(description='Soft-deleted posts purged'),
+        'documents_purged': fields.Integer(description='Reactions, comments and notifications purged with the posts'),
+        'orphans_purged': fields.Integer(description='Documents referencing missing posts removed by the sweeper'),
+        'errors': fields.Integer(description='Failed purge runs'),
+        'running': fields.Boolean(description='Whether the purger thread is alive'),
+        'last_sweep': fields.String(description='Time of the last orphan sweep'),
+    }
+)
+
+
+@api.route('/purge')
+class PurgeMetrics(Resource):
+    @api.marshal_with(purge_stats_model, code=200)
+    @api.response(200, 'OK')
+    def get(self):
+        '''
+        Progress of the background purge of deleted posts in this process
+        '''
+        return purger.stats(), 200
+
+
+dispatcher_stats_model = api.model(
+    'Dispatcher stats model',
+    {
+        'queued': fields.Integer(description='Events queued for the notifier'),
+        'sent': fields.Integer(description='Events delivered to the notifier'),
+        'failed': fields.Integer(description='Events in batches the notifier did not accept or could not be reached for'),
+        'rejected': fields.Integer(description='Events the notifier rejected as invalid while emitting the rest of their batch'),
+        'dropped': fields.Integer(description='Events dropped because the queue was full'),
+        'batches': fields.Integer(description='Flushed batches of events'),
+        'depth': fields.Integer(description='Events currently waiting in the queue'),
+        'max_depth': fields.Integer(description='Capacity of the queue'),
+        'workers': fields.Integer(description='Alive worker threads'),
+    }
+)
+
+
+@api.route('/dispatcher')
+class DispatcherMetrics(Resource):
+    @api.marshal_with(dispatcher_stats_model, code=200)
+    @api.response(200, 'OK')
+    def get(self):
+        '''
+        Backlog and delivery counters of the notification dispatch queue in this process
+        '''
+        return dispatcher.stats(), 200
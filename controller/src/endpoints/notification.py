@@ -7,6 +7,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from ..database.queries import Queries as db
 from ..utils.fields import DynamicModelField
+from ..utils.cursor import MAX_PAGE_SIZE, decode_cursor, next_cursor
+from ..utils.serializer import serialize_with
 
 
 log = logging.getLogger('NOTIFICATION')
@@ -76,8 +78,9 @@ delete_model = api.model(
 class Notification(Resource):
     @api.doc(
         params={
-            'last_timestamp': {'description': 'Timestamp of last fetched notification', 'type': str, 'required': True},
-            'quantity': {'description': 'Quantity of reactions to fetch', 'type': int, 'default': 10, 'required': True},
+            'cursor': {'description': 'Continuation cursor returned in `X-Next-Cursor` header of the previous page', 'type': str, 'required': False},
+            'last_timestamp': {'description': 'Deprecated, use `cursor`. Timestamp of last fetched notification', 'type': str, 'required': False},
+            'quantity': {'description': f'Quantity of notifications to fetch (at most {MAX_PAGE_SIZE})', 'type': int, 'default': 10, 'required': True},
             'Authorization': {
                 'description': 'Bearer token for authentication',
                 'required': True,
@@ -86,7 +89,7 @@ class Notification(Resource):
             }
         }
     )
-    @api.marshal_list_with(get_model, code=200)
+    @serialize_with(get_model, as_list=True, code=200)
     @api.response(200, 'OK')
     @api.response(400, 'Bad Request')
     @api.response(500, 'Database Error')
@@ -100,57 +103,44 @@ class Notification(Resource):
         if quantity is None or quantity <= 0:
             log.error(f'Got {quantity = }, quantity is required and must be a positive integer')
             api.abort(400, 'Bad Request')
+        quantity = min(quantity, MAX_PAGE_SIZE)
+
+        cursor = request.args.get('cursor', None)
+        if cursor:
+            try:
+                cursor = decode_cursor(cursor)
+            except ValueError:
+                log.error(f'Got invalid {cursor = }')
+                api.abort(400, 'Bad Request')
         
         last_timestamp = request.args.get('last_timestamp', None)
         if last_timestamp:
             last_timestamp = datetime.strptime(last_timestamp, "%Y-%m-%d %H:%M:%S")
         
         queries = db()
-        raw_results = queries.get_notifications(user_id, last_timestamp, quantity)
+        raw_results = queries.get_notifications(user_id, last_timestamp, quantity, cursor)
 
         if raw_results is False:
             log.info('Problem during getting notifications')
             api.abort(500, 'Database Error')
 
-        formatted_results = []
-
-        for result in raw_results:
-            if 'reaction_type' in result:  # reaction
-                formatted_results.append({
-                    'notification_type': 'reaction',
-                    'notification_id': str(result.get('_id')),
-                    'timestamp': result.get('timestamp'),
-                    'data': {
-                        'post_id': result.get('post_id'),
-                        'user_id': result.get('user_id'),
-                        'username': result.get('username'),
-                        'reaction_type': result.get('reaction_type')
-                    }
-                })
-            elif 'city' in result:  # scan
-                formatted_results.append({
-                    'notification_type': 'scan',
-                    'notification_id': str(result.get('_id')),
-                    'timestamp': result.get('timestamp'),
-                    'data': {
-                        'city': result.get('city'),
-                        'latitude': result.get('latitude'),
-                        'longitude': result.get('longitude')
-                    }
-                })
-            else:  # comment
-                formatted_results.append({
-                    'notification_type': 'comment',
-                    'notification_id':str(result.get('_id')),
-                    'timestamp': result.get('timestamp'),
-                    'data': {
-                        'post_id': result.get('post_id'),
-                        'user_id': result.get('user_id'),
-                        'username': result.get('username')
-                    }
-                })
-
-        return formatted_results, 200
+        # inbox entries are flat, `data` picks the fields of its notification type
+        formatted_results = [
+            {
+                'notification_type': result.get('notification_type'),
+                'notification_id': result.get('_id'),
+                'timestamp': result.get('timestamp').strftime("%Y-%m-%d %H:%M:%S"),
+                'data': result
+            }
+            for result in raw_results
+        ]
+
+        headers = {}
+        cursor = next_cursor(raw_results, quantity, id_key='_id')
+        if cursor:
+            headers['X-Next-Cursor'] = cursor
+
+        return formatted_results, 200, headers
     
     @api.doc(params={
         'Authorization': {
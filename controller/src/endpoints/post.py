@@ -1,26 +1,31 @@
 import logging
-import os
 from datetime import datetime
 
-from flask import request
+from flask import request, Response
 from flask_restx import Resource, fields, Namespace
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
 from bson.objectid import ObjectId
+from werkzeug.exceptions import RequestEntityTooLarge
 
-from ..database.queries import Queries as db
-from ..utils.request import send_request
+from ..database.queries import Queries as db, REACTION_TYPES
+from ..database.cache import post_fragments
 from ..utils.apps import Services
-from ..utils.apps import Url
+from ..utils.cursor import MAX_PAGE_SIZE, decode_cursor, keyset_filter, next_cursor, decode_score_cursor, encode_score_cursor
+from ..utils.search import MAX_SEARCH_RESULTS
+from ..utils.etag import compute_etag, etag_headers, is_not_modified
+from ..utils.serializer import serialize_with, compile_model, encode
+from ..utils.images import ImageTooLargeError, InvalidImageError, upload_images
 
 
 log = logging.getLogger('POST')
 
 api = Namespace('post')
 
-reaction_model = api.model('Reaction', {
-    'id': fields.String(description="Unique ID of the reaction", example="12345"),
-    'user_id': fields.String(description="ID of the user who reacted", example="671f880f5bf26ed4c9f540fd"),
-    'reaction_type': fields.String(description="Type of reaction", example="heart")
+reactions_count_model = api.model('ReactionsCount', {
+    reaction_type: fields.Integer(description=f"Number of '{reaction_type}' reactions", default=0, example=3)
+    for reaction_type in REACTION_TYPES
 })
 
 post_model = api.model('Post', {
@@ -34,28 +39,105 @@ post_model = api.model('Post', {
     }), description="User information of the post creator"),
     'location': fields.String(description="Location of the post", example="Krakow"),
     'timestamp': fields.String(description="Timestamp of the post", example="2024-12-05 21:18:07"),
-    'reactions': fields.List(fields.Nested(reaction_model), description="List of reactions to the post")
+    'reactions_count': fields.Nested(reactions_count_model, description="Number of reactions to the post per type"),
+    'user_reaction': fields.String(description="Type of the reaction given by the requesting user, null if none", example="heart")
 })
 
 
 
+# post without the viewer dependent `user_reaction`, which is spliced into cached fragments per request
+post_fragment_model = api.model('PostFragment', {key: field for key, field in post_model.items() if key != 'user_reaction'})
+encode_post_fragment = compile_model(post_fragment_model)
+
 post_list_model = api.model('PostList', {
-    'posts': fields.List(fields.Nested(post_model), description="List of posts")
+    'posts': fields.List(fields.Nested(post_model), description="List of posts"),
+    'next_cursor': fields.String(description="Cursor of the next page, null if there are no more posts", example="WyIyMDI1LTAxLTAxVDEyOjAwOjAwIiwiNjc1MjI2OWY2ZjIxOGY4NTk2NjhjNGJhIl0")
 })
 
 
+def viewer_id() -> str | None:
+    """
+    ID of the requesting user if a valid token was sent, None for anonymous requests.
+    An expired, malformed or badly signed token is treated as no token, public reads do not fail on it.
+    """
+    try:
+        verify_jwt_in_request(optional=True)
+    except (JWTExtendedException, PyJWTError) as e:
+        log.debug(f"Ignoring invalid token of anonymous read: {e}")
+        return None
+    return get_jwt_identity()
+
+
+def posts_etag(queries: db, probes: list[dict], viewer: str | None) -> str:
+    """
+    ETag of a page of posts as seen by `viewer`, from versions of the posts and summaries of their authors.
+    A change of viewer's own reaction bumps the post version as well.
+    """
+    authors = queries.get_authors([probe.get('user_id') for probe in probes])
+    return compute_etag(viewer, [
+        (probe['_id'], probe.get('version', 0), authors.get(str(probe.get('user_id'))))
+        for probe in probes
+    ])
+
+
+def render_posts(queries: db, probes: list[dict], viewer: str | None, scores: bool = False) -> list[bytes]:
+    """
+    Serialised posts in order of `probes` (see `Queries.probe_posts`). Fragments are served from
+    `post_fragments` while the post version and its author summary are unchanged, only missing
+    posts are aggregated. Viewer's `user_reaction` (and `score` of search results) is spliced in.
+    """
+    authors = queries.get_authors([probe.get('user_id') for probe in probes])
+
+    versions = {}
+    fragments = {}
+    for probe in probes:
+        id = str(probe['_id'])
+        author = authors.get(str(probe.get('user_id')), {})
+        versions[id] = (probe.get('version', 0), author.get('username'), author.get('image'))
+        fragment = post_fragments.get(id, versions[id])
+        if fragment is not None:
+            fragments[id] = fragment
+
+    missing = [probe['_id'] for probe in probes if str(probe['_id']) not in fragments]
+    if missing:
+        for post in queries.fetch_posts(query={'_id': {'$in': missing}}, limit=len(missing)):
+            fragment = encode(encode_post_fragment(post))
+            post_fragments.set(post['id'], versions[post['id']], fragment)
+            fragments[post['id']] = fragment
+
+    reactions = queries.get_user_reactions(viewer, [probe['_id'] for probe in probes]) if viewer else {}
+
+    rendered = []
+    for probe in probes:
+        id = str(probe['_id'])
+        if id not in fragments:
+            # deleted since probed
+            continue
+        tail = b',"user_reaction":' + encode(reactions.get(id))
+        if scores:
+            tail += b',"score":' + encode(probe.get('score'))
+        rendered.append(fragments[id][:-1] + tail + b'}')
+
+    return rendered
+
+
+def posts_page(posts: list[bytes], cursor: str | None) -> bytes:
+    return b'{"posts":[' + b','.join(posts) + b'],"next_cursor":' + encode(cursor) + b'}'
+
+
 @api.route('/')
 class Post(Resource):
     @api.doc(
         params={
             "user_id": {"description": "Filter posts by user ID.", "example": "671f880f5bf26ed4c9f540fd", "required": False},
-            "last_timestamp": {"description": "Timestamp of the last fetched post (ISO format)", "example": "2025-01-01T12:00:00", "required": False},
-            "limit": {"description": "Number of posts to fetch", "example": 10, "required": False}
+            "cursor": {"description": "Continuation cursor returned as `next_cursor` by the previous page", "required": False},
+            "last_timestamp": {"description": "Deprecated, use `cursor`. Timestamp of the last fetched post (ISO format)", "example": "2025-01-01T12:00:00", "required": False},
+            "limit": {"description": f"Number of posts to fetch (at most {MAX_PAGE_SIZE})", "example": 10, "required": False}
         }
     )
     @api.response(200, "OK")
     @api.response(500, "Failed to fetch posts")
-    @api.marshal_with(post_list_model, code=200)
+    @serialize_with(post_list_model, code=200)
     def get(self):
         """
         Fetch posts based on optional filters (e.g., user ID, timestamp, pagination)
@@ -63,8 +145,13 @@ class Post(Resource):
         try:
             # Read query parameters
             user_id = request.args.get('user_id')
+            cursor = request.args.get('cursor')
             last_timestamp = request.args.get('last_timestamp')
-            limit = int(request.args.get('limit', 10))
+            limit = request.args.get('limit', 10, type=int)
+            if limit <= 0:
+                log.error(f"Invalid limit: {request.args.get('limit')}")
+                return {"message": "Bad Request: limit must be a positive integer."}, 400
+            limit = min(limit, MAX_PAGE_SIZE)
 
             # Initialize query
             query = {}
@@ -75,7 +162,13 @@ class Post(Resource):
                     log.error(f"Invalid user_id format: {user_id}")
                     return {"message": "Invalid user_id format."}, 400
 
-            if last_timestamp:
+            if cursor:
+                try:
+                    query.update(keyset_filter(decode_cursor(cursor)))
+                except ValueError:
+                    log.error(f"Invalid cursor: {cursor}")
+                    return {"message": "Invalid cursor."}, 400
+            elif last_timestamp:
                 try:
                     query['timestamp'] = {'$lt': datetime.fromisoformat(last_timestamp)}
                 except ValueError:
@@ -84,11 +177,21 @@ class Post(Resource):
 
             log.info(f"Fetching posts with query: {query}, limit: {limit}")
 
-            # Fetch posts with aggregation pipeline
-            posts = db().fetch_posts(query=query, limit=limit)
+            queries = db()
+            viewer = viewer_id()
+            probes = queries.probe_posts(query, limit)
+
+            # Answer unchanged page before running the aggregation
+            etag = posts_etag(queries, probes, viewer)
+            if is_not_modified(etag):
+                return None, 304, etag_headers(etag)
 
-            log.info(f"Posts fetched: {posts}")
-            return {"posts": posts}, 200
+            # Assemble cached post fragments, aggregating only missing ones
+            posts = render_posts(queries, probes, viewer)
+
+            log.info(f"Posts fetched: {len(posts)}")
+            body = posts_page(posts, next_cursor(probes, limit, id_key='_id'))
+            return Response(body, 200, etag_headers(etag), mimetype='application/json')
 
         except Exception as e:
             log.error(f"Error in GET /posts: {e}")
@@ -99,6 +202,7 @@ class Post(Resource):
     @api.marshal_with(post_model, code=201)
     @api.response(201, "Post created successfully")
     @api.response(400, "Invalid data provided")
+    @api.response(413, "Images too large")
     @api.response(500, "Failed to create post")
     def put(self):
         """
@@ -118,38 +222,36 @@ class Post(Resource):
                 return {"message": "'content' is a required field."}, 400
 
             # Validate user existence
-            user = queries.get_user_by_id(user_id)
+            user = queries.get_author(user_id)
             if not user:
                 return {"message": "User not found"}, 404
 
-            # Upload files to Imgur
+            # Downscale and upload files to Imgur concurrently
             image_urls = []
             if files:
-                headers = {"Authorization": f"Client-ID {os.environ.get('IMGUR_CLIENT_ID')}"}
-
-                for file in files:
-                    try:
-                        response = send_request('POST', Url.IMGUR, files={'image': file}, headers=headers)
+                try:
+                    image_urls = upload_images(files)
 
-                        if response.status_code != 200:
-                            log.error(f"Failed to upload image to Imgur: {response}")
-                            return {"message": "Failed to upload one or more images to Imgur."}, 500
+                except InvalidImageError as e:
+                    log.info(f"Invalid image in post: {e}")
+                    return {"message": "One or more files are not valid images."}, 400
 
-                        imgur_data = response.json()
-                        image_urls.append(imgur_data['data']['link'])
+                except ImageTooLargeError as e:
+                    log.info(f"Too large image in post: {e}")
+                    return {"message": "One or more images are too large."}, 413
 
-                    except Exception as e:
-                        log.error(f"Exception during file upload to Imgur: {e}")
-                        return {"message": "Failed to upload images to Imgur."}, 500
+                except Exception as e:
+                    log.error(f"Exception during file upload to Imgur: {e}")
+                    return {"message": "Failed to upload images to Imgur."}, 500
 
             # Prepare post data
             post_data = {
                 "description": content,   
                 "images_urls": image_urls,
-                "comments": [],
+                "comments_count": 0,
                 "timestamp": datetime.utcnow(),
                 "location": location,
-                "reactions": [],
+                "reactions_count": {},
                 "user_id": ObjectId(user_id),  
             }
 
@@ -170,9 +272,12 @@ class Post(Resource):
                 },
                 "location": location,
                 "timestamp": datetime.utcnow().isoformat(),
-                "reactions": [],
+                "reactions_count": {},
+                "user_reaction": None,
             }, 201
 
+        except RequestEntityTooLarge:
+            raise
         except Exception as e:
             log.error(f"Error in PUT /posts: {e}")
             return {"message": "An unexpected error occurred."}, 500
@@ -189,7 +294,7 @@ class Post(Resource):
     @api.response(500, "Failed to delete post")
     def delete(self):
         """
-        Delete a post along with its associated comments and reactions
+        Delete a post, its comments and reactions are purged in background
         """
         user_id = get_jwt_identity()  # Get the ID of the logged-in user
         queries = db()  # Database queries instance
@@ -226,20 +331,29 @@ class SinglePost(Resource):
     )
     @api.response(200, "OK")
     @api.response(500, "Internal Server Error")
-    @api.marshal_with(post_model, code=200)
+    @serialize_with(post_model, code=200)
     def get(self):
         """
         Fetch single post based on its ID
         """
         try:
             post_id = request.args.get('id')
-            
-            post = db().fetch_posts(query={'_id': ObjectId(post_id)}, limit=1)
+            query = {'_id': ObjectId(post_id)}
+
+            queries = db()
+            viewer = viewer_id()
+            probes = queries.probe_posts(query, 1)
+
+            etag = posts_etag(queries, probes, viewer)
+            if is_not_modified(etag):
+                return None, 304, etag_headers(etag)
+
+            post = render_posts(queries, probes, viewer)
 
             assert post
 
-            log.info(f"Post fetched: {post}")
-            return post[0], 200
+            log.info(f"Post fetched: {post_id}")
+            return Response(post[0], 200, etag_headers(etag), mimetype='application/json')
 
         except Exception as e:
             log.error(f"Error: {e}")
@@ -259,6 +373,8 @@ class Search(Resource):
     @api.doc(params={
         'query': {'description': 'Search query string (username or content)', 'example': 'Fra', 'required': True},
         'type': {'description': 'Search type: username or content', 'example': 'username', 'required': True},
+        'cursor': {'description': 'Content search only, continuation cursor returned as `next_cursor` by the previous page', 'required': False},
+        'limit': {'description': f'Content search only, number of posts to fetch (at most {MAX_PAGE_SIZE})', 'example': 10, 'required': False},
     })
     @api.response(200, 'OK')
     @api.response(400, 'Bad Request')
@@ -289,13 +405,39 @@ class Search(Resource):
                 return {"users": results}, 200
 
             elif search_type.lower() == 'content':
-                results = queries.search_posts(search_term=query) or []
-                if not results:
+                cursor = request.args.get('cursor')
+                limit = request.args.get('limit', 10, type=int)
+                if limit <= 0:
+                    log.error(f"Invalid limit: {request.args.get('limit')}")
+                    return {"message": "Bad Request: limit must be a positive integer."}, 400
+                limit = min(limit, MAX_PAGE_SIZE)
+
+                decoded_cursor = None
+                if cursor:
+                    try:
+                        decoded_cursor = decode_score_cursor(cursor)
+                    except ValueError:
+                        log.error(f"Invalid cursor: {cursor}")
+                        return {"message": "Invalid cursor."}, 400
+
+                offset = decoded_cursor[2] if decoded_cursor else 0
+                limit = min(limit, MAX_SEARCH_RESULTS - offset)
+                if limit <= 0:
+                    return {"posts": [], "next_cursor": None}, 200
+
+                results = queries.search_posts(search_term=query, limit=limit, cursor=decoded_cursor) or []
+                if not results and not cursor:
                     log.info(f"No results found for content: {query}")
                     return {"message": "No results found for content."}, 404
 
+                offset += len(results)
+                cursor = None
+                if len(results) == limit and offset < MAX_SEARCH_RESULTS:
+                    cursor = encode_score_cursor(results[-1]['score'], results[-1]['_id'], offset)
+
                 log.info(f"Found {len(results)} posts for query: {query}")
-                return {"posts": results}, 200
+                posts = render_posts(queries, results, viewer_id(), scores=True)
+                return Response(posts_page(posts, cursor), 200, mimetype='application/json')
 
             else:
                 log.error(f"Invalid search type: {search_type}")
@@ -1,16 +1,20 @@
 import logging
 from datetime import datetime
-import qrcode 
 import base64
 
-from io import BytesIO
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from flask import request
+from bson.objectid import ObjectId
+from flask import request, Response, stream_with_context
+from werkzeug.datastructures import MultiDict
 from flask_restx import Resource, fields, Namespace
 
 from ..database.queries import Queries as db
-from ..utils.request import send_request
-from ..utils.apps import Services
+from ..utils.dispatcher import dispatcher
+from ..utils.etag import compute_etag, etag_headers, is_not_modified
+from ..utils.apps import QR
+from ..utils.qr import QrOptions, qr_codes
+from ..utils.qr_batch import OUTPUTS, stream_batch
+from ..utils.serializer import serialize_with
 
 
 log = logging.getLogger('QR')
@@ -40,6 +44,17 @@ generate_qr_model = api.model(
     }
 )
 
+batch_input_model = api.model(
+    'QR batch input model', {
+        'user_ids': fields.List(fields.String, required=True, description='IDs of users (pet profiles) to print tags for'),
+        'output': fields.String(default='pdf', enum=list(OUTPUTS), description='zip of codes, pdf sheets or zip of png sheets'),
+        'format': fields.String(default='png', description='Image format of codes in zip output: png or svg'),
+        'box_size': fields.Integer(default=10, description='Pixels of one QR module'),
+        'border': fields.Integer(default=4, description='Width of the quiet zone in modules'),
+        'error_correction': fields.String(default='L', description='Error correction level: L, M, Q or H'),
+    }
+)
+
 
 @api.route('/scan')
 class Scan(Resource):
@@ -72,46 +87,125 @@ class Scan(Resource):
         send_json['data'].pop('ip')
         send_json['user_owner_id'] = send_json.pop('user_id')
         
-        try:
-            send_request('POST', Services.NOTIFIER, '/emit/scan', json_data=send_json)
-        except Exception as e:
-            log.info(f'Error during sending notification for {user_id = } via websocket: {e}')
+        # delivered in the background, the notification is already in the owner's inbox
+        dispatcher.emit('scan', send_json)
             
         return {}, 200
 
+qr_options_params = {
+    'format': {'description': 'Image format: png or svg', 'default': 'png'},
+    'box_size': {'description': 'Pixels of one QR module (png only)', 'default': 10, 'type': 'integer'},
+    'border': {'description': 'Width of the quiet zone in modules', 'default': 4, 'type': 'integer'},
+    'error_correction': {'description': 'Error correction level: L, M, Q or H', 'default': 'L'},
+}
+
+
 @api.route('/generator')
 class Generator(Resource):
-    @api.marshal_with(generate_qr_model, code=200)
+    @api.doc(params=qr_options_params)
+    @serialize_with(generate_qr_model, code=200)
+    @api.response(304, 'Not Modified')
+    @api.response(400, 'Bad Request')
+    @api.response(401, 'Invalid credentials')
+    @api.response(500, 'Internal Server Error')
+    @jwt_required()
+    def get(self):
+        '''
+        QR code of the logged user's profile encoded in base64
+        '''
+        try:
+            options = QrOptions.from_args(request.args)
+        except ValueError as e:
+            api.abort(400, str(e))
+
+        try:
+            key, content = qr_codes.get(get_jwt_identity(), options)
+        except Exception as e:
+            log.error(f"Error generating QR code: {e}")
+            api.abort(500, 'Internal Server Error')
+
+        # same code, but another representation than the raw image
+        etag = compute_etag(key, 'base64')
+        if is_not_modified(etag):
+            return None, 304, etag_headers(etag)
+
+        return {'qr': base64.b64encode(content).decode('utf-8')}, 200, etag_headers(etag)
+
+
+@api.route('/generator/image')
+class GeneratorImage(Resource):
+    @api.doc(params=qr_options_params)
+    @api.response(200, 'OK')
+    @api.response(304, 'Not Modified')
+    @api.response(400, 'Bad Request')
     @api.response(401, 'Invalid credentials')
     @api.response(500, 'Internal Server Error')
     @jwt_required()
     def get(self):
+        '''
+        QR code of the logged user's profile as a raw PNG or SVG image
+        '''
         try:
-            # Pobranie informacji o zalogowanym użytkowniku (wymaga JWT)
-            user_id = get_jwt_identity()
-
-            # Generowanie kodu QR z URL do redirectera
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr_data = f"http://localhost:5002/pet-book/?id={user_id}"
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-
-            # Konwertowanie obrazu QR do formatu base64
-            img = qr.make_image(fill_color="black", back_color="white")
-            buffered = BytesIO()
-            img.save(buffered, format="PNG")
-            qr_encoded = base64.b64encode(buffered.getvalue()).decode('utf-8')
-
-            # Zwracanie zakodowanego obrazu QR w odpowiedzi
-            return {'qr': qr_encoded}, 200
+            options = QrOptions.from_args(request.args)
+        except ValueError as e:
+            api.abort(400, str(e))
 
+        try:
+            key, content = qr_codes.get(get_jwt_identity(), options)
         except Exception as e:
-            # Logowanie błędu i zwrócenie odpowiedzi 500
             log.error(f"Error generating QR code: {e}")
             api.abort(500, 'Internal Server Error')
-  
+
+        if is_not_modified(key):
+            return Response(status=304, headers=etag_headers(key))
+
+        return Response(content, 200, etag_headers(key), mimetype=options.mimetype)
+
+
+@api.route('/batch')
+class Batch(Resource):
+    @api.expect(batch_input_model, validate=True)
+    @api.response(200, 'OK')
+    @api.response(400, 'Bad Request')
+    @api.response(401, 'Invalid credentials')
+    @api.response(404, 'User not found')
+    @jwt_required()
+    def post(self):
+        '''
+        QR tags of many profiles as a ZIP of codes or print-ready PDF or PNG sheets, streamed while rendered
+        '''
+        json_data = request.get_json()
+        output = json_data.get('output', 'pdf')
+        user_ids = list(dict.fromkeys(json_data['user_ids']))
+
+        if not user_ids:
+            api.abort(400, 'No user IDs given')
+        if len(user_ids) > QR.batch_max_codes:
+            api.abort(400, f'At most {QR.batch_max_codes} QR codes can be generated at once')
+        if not all(ObjectId.is_valid(user_id) for user_id in user_ids):
+            api.abort(400, 'Invalid user ID')
+
+        try:
+            options = QrOptions.from_args(MultiDict({
+                key: json_data[key] for key in ('format', 'box_size', 'border', 'error_correction') if key in json_data
+            }))
+        except ValueError as e:
+            api.abort(400, str(e))
+        if output != 'zip':
+            # sheets are composed from PNG codes
+            options = QrOptions(format='png', box_size=options.box_size, border=options.border, error_correction=options.error_correction)
+
+        authors = db().get_authors(user_ids)
+        missing = [user_id for user_id in user_ids if user_id not in authors]
+        if missing:
+            api.abort(404, f"Users not found: {', '.join(missing[:10])}")
+        labels = {user_id: authors[user_id].get('username') or '' for user_id in user_ids}
+
+        log.info(f'Generating {len(user_ids)} QR codes as {output} for {get_jwt_identity()}')
+        mimetype, extension = OUTPUTS[output]
+        return Response(
+            stream_with_context(stream_batch(output, user_ids, options, labels)),
+            200,
+            {'Content-Disposition': f'attachment; filename="qr-codes.{extension}"'},
+            mimetype=mimetype
+        )
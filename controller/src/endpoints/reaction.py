@@ -5,9 +5,8 @@ from flask import request
 from flask_restx import Resource, fields, Namespace
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
-from ..database.queries import Queries as db
-from ..utils.request import send_request
-from ..utils.apps import Services
+from ..database.queries import Queries as db, REACTION_TYPES
+from ..utils.dispatcher import dispatcher
 
 
 log = logging.getLogger('REACTION')
@@ -38,7 +37,7 @@ get_reactions_model = api.model(
 put_reaction_model = api.model(
     'Put reaction model', 
     {
-        'reaction_type': fields.String(required=True, description='Type of the reaction'),
+        'reaction_type': fields.String(required=True, description='Type of the reaction', enum=REACTION_TYPES),
         'post_id': fields.String(required=True, description='Unique ID of the reacted post')
     }
 )
@@ -100,19 +99,19 @@ class Reaction(Resource):
         timestamp = datetime.now()
         
         queries = db()
-        user_owner_id = queries.get_post_by_id(post_id).get('user_id')
+        user_owner_id = (queries.get_post_by_id(post_id, {'user_id': True}) or {}).get('user_id')
         
         if not user_owner_id:
             log.info('User owner not found')
             api.abort(404, "User not found")
         
-        username = queries.get_user_by_id(user_id).get('username')
+        username = queries.get_author(user_id).get('username')
         
         if not username:
             log.info('User that reacted not found')
             api.abort(404, "User not found")
         
-        reaction_id = queries.insert_reaction(post_id, user_id, reaction_type, timestamp)
+        reaction_id = queries.insert_reaction(post_id, user_id, reaction_type, timestamp, user_owner_id, username)
         
         if not reaction_id:
             log.error(f'Cannot insert reaction for data: {post_id = }, {user_id = }, {reaction_type = }')
@@ -130,10 +129,8 @@ class Reaction(Resource):
             'timestamp': str(timestamp)
         }
         log.info(f"reaction json data: {json_data}")
-        try:
-            send_request('POST', Services.NOTIFIER, '/emit/reaction', json_data=json_data)
-        except Exception as e:
-            log.info(f'Error during sending notification for {user_owner_id = } via websocket: {e}')
+        # delivered in the background, the notification is already in the owner's inbox
+        dispatcher.emit('reaction', json_data)
 
         return {}, 201
 
@@ -1,15 +1,18 @@
 import logging
-import os
 
 import bcrypt
-from flask import request
+from flask import request, Response, stream_with_context
 from flask_restx import Resource, fields, Namespace
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from werkzeug.exceptions import BadRequest
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import DuplicateKeyError
+from werkzeug.exceptions import BadRequest, HTTPException
 
-from ..database.queries import Queries as db
-from ..utils.apps import Url
-from ..utils.request import send_request
+from ..database.queries import Queries as db, EXPORT_SECTIONS
+from ..utils.ndjson import MIMETYPE, ndjson_stream
+from ..utils.etag import compute_etag, etag_headers, is_not_modified
+from ..utils.images import ImageTooLargeError, InvalidImageError, upload_image
 
 
 log = logging.getLogger('USER')
@@ -32,8 +35,8 @@ user_model = api.model(
         'bio': fields.String(description="Bio of the user", example="bio"),
         'email': fields.String(description="Email address of the user", example="kasia@gmail.com"),
         'profile_picture_url': fields.String(description="Profile picture URL", example="https://i.imgur.com/9P3c7an.jpeg"),
-        'scans': fields.List(fields.String, description="List of user scans IDs", example=["6741f6491a7d7e60b197e7b7"]),
-        'posts': fields.List(fields.String, description="List of user posts IDs", example=["67524226995227baafe49eed"]),
+        'scans_count': fields.Integer(description="Number of user QR code scans", example=4),
+        'posts_count': fields.Integer(description="Number of user posts", example=12),
         'location': fields.String(description="User location (city)", example="Krakow"),
         'is_premium': fields.Boolean(description="Whether user has premium status", example=True),
         'is_private': fields.Boolean(description="Whether user's profile is private", example=False),
@@ -90,6 +93,15 @@ class User(Resource):
 
         queries = db()
 
+        version = queries.get_user_version({'username': username})
+        if not version:
+            log.error(f'Error fetching data for {username}')
+            api.abort(404, "User Not Found")
+
+        etag = compute_etag('user', version['_id'], version.get('version', 0))
+        if is_not_modified(etag):
+            return None, 304, etag_headers(etag)
+
         user_data = queries.get_user_by_username(username)
         log.info(f"User data fetched: {user_data}")
 
@@ -97,7 +109,7 @@ class User(Resource):
             log.error(f'Error fetching data for {username}')
             api.abort(404, "User Not Found")
         
-        return user_data, 200
+        return user_data, 200, etag_headers(etag)
 
     def put(self):
         '''
@@ -169,6 +181,40 @@ class Self(Resource):
         return {"message": "User data updated successfully"}, 200
 
 
+@api.route('/export')
+class Export(Resource):
+    @api.doc(params={
+        'sections': {'description': f'Comma separated subset of {", ".join(EXPORT_SECTIONS)}', 'example': 'scans,posts', 'required': False},
+        'Authorization': {
+            'description': 'Bearer token for authentication',
+            'required': True,
+            'in': 'header',
+            'default': 'Bearer '
+        }
+    })
+    @api.produces([MIMETYPE])
+    @api.response(200, 'OK')
+    @api.response(400, 'Bad Request')
+    @api.response(401, 'Unauthorized')
+    @jwt_required()
+    def get(self):
+        '''
+        Export self user scans, posts and comments as newline delimited JSON, streamed as it is read
+        '''
+        user_id = get_jwt_identity()
+        sections = tuple(filter(None, request.args.get('sections', ','.join(EXPORT_SECTIONS)).split(',')))
+
+        if not sections or not set(sections) <= set(EXPORT_SECTIONS):
+            api.abort(400, 'Bad Request')
+
+        records = db().export_user(user_id, sections)
+        return Response(
+            stream_with_context(ndjson_stream(records)),
+            mimetype=MIMETYPE,
+            headers={'Content-Disposition': f'attachment; filename=petbook-{user_id}.ndjson'}
+        )
+
+
 @api.route('/login')
 class Login(Resource):
     @api.expect(login_input_model, validate=True)
@@ -208,14 +254,16 @@ class Signup(Resource):
 
             queries = db()
 
-            if queries.get_user_by_username(username):
+            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            try:
+                user_id = queries.create_user(username, email, hashed_password, phone)
+            except DuplicateKeyError as e:
+                if 'email' in (e.details or {}).get('keyPattern', {}):
+                    raise BadRequest('Email already exists')
                 raise BadRequest('Username already exists')
 
-            if queries.get_user_by_email(email):
-                raise BadRequest('Email already exists')
-
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-            user_id = queries.create_user(username, email, hashed_password, phone)
+            if not user_id:
+                raise Exception(f'User {username} not inserted')
 
             return {'message': 'User created successfully', 'user_id': str(user_id)}, 200
 
@@ -284,11 +332,24 @@ class UserPicture(Resource):
             api.abort(400, "User ID not provided")
         
         queries = db()
+
+        try:
+            version = queries.get_user_version({'_id': ObjectId(user_id)})
+        except InvalidId:
+            api.abort(400, "Invalid user ID")
+
+        if not version:
+            api.abort(404, "User not found")
+
+        etag = compute_etag('user-picture', version['_id'], version.get('version', 0))
+        if is_not_modified(etag):
+            return None, 304, etag_headers(etag)
+
         user = queries.get_user_by_id(user_id)
         if not user:
             api.abort(404, "User not found")
 
-        return {"profile_picture_url": user.get("profile_picture_url", '')}, 200
+        return {"profile_picture_url": user.get("profile_picture_url", '')}, 200, etag_headers(etag)
 
     @api.doc(
         consumes=["multipart/form-data"],
@@ -306,6 +367,7 @@ class UserPicture(Resource):
     @api.response(400, 'Bad Request')
     @api.response(401, 'Unauthorized')
     @api.response(404, "User not found")
+    @api.response(413, 'Picture too large')
     @api.response(500, "Failed to upload image or update profile picture")
     @jwt_required()
     def put(self):
@@ -327,19 +389,19 @@ class UserPicture(Resource):
             picture = request.files['picture']
 
             try:
-                headers = {"Authorization": f"Client-ID {os.environ.get('IMGUR_CLIENT_ID')}"}
-                response = send_request('POST', Url.IMGUR, files={'image': picture}, headers=headers)
-            
+                new_picture_url = upload_image(picture)
+
+            except InvalidImageError as e:
+                log.info(f'Invalid profile picture: {e}')
+                api.abort(400, 'Picture is not a valid image')
+
+            except ImageTooLargeError as e:
+                log.info(f'Too large profile picture: {e}')
+                api.abort(413, 'Picture is too large')
+
             except Exception as e:
                 log.error(f'Exception during sending file to imgur service: {e}')
                 api.abort(500, 'Failed to upload image to Imgur')
-            
-            if response.status_code != 200:
-                log.error(f'Got unexpected response from imgur service: {response}')
-                api.abort(500, "Failed to upload image to Imgur")
-
-            imgur_data = response.json()
-            new_picture_url = imgur_data['data']['link']
 
             result = queries.update_user_picture(user_id, new_picture_url)
             if not result:
@@ -347,6 +409,8 @@ class UserPicture(Resource):
             
             return {"profile_picture_url": new_picture_url}, 200
 
+        except HTTPException:
+            raise
         except Exception as e:
             api.abort(500, "An unexpected error occurred.")
 
@@ -23,6 +23,188 @@ class Service:
         )
 
 
+@dataclass
+class Http:
+    pool_connections: int
+    pool_maxsize: int
+    connect_timeout_seconds: float
+    read_timeout_seconds: float
+    retries: int
+    backoff_factor: float
+    backoff_jitter: float
+
+    @classmethod
+    def load(cls) -> Http:
+        with open('/app/config/apps.yaml', 'r') as file:
+            config = yaml.safe_load(file).get('http', {})
+        return cls(
+            pool_connections=config.get('pool_connections', 1),
+            pool_maxsize=config.get('pool_maxsize', 10),
+            connect_timeout_seconds=config.get('connect_timeout_seconds', 5),
+            read_timeout_seconds=config.get('read_timeout_seconds', 30),
+            retries=config.get('retries', 0),
+            backoff_factor=config.get('backoff_factor', 0),
+            backoff_jitter=config.get('backoff_jitter', 0)
+        )
+
+
+@dataclass
+class Database:
+    max_pool_size: int
+    min_pool_size: int
+    max_idle_time_ms: int
+    connect_timeout_ms: int
+    server_selection_timeout_ms: int
+    socket_timeout_ms: int
+    compressors: str
+    warm_up: bool
+    ensure_indexes: bool
+    slow_query_ms: float | None
+    explain_slow_queries: bool
+    stream_batch_size: int
+
+    @classmethod
+    def load(cls) -> Database:
+        with open('/app/config/apps.yaml', 'r') as file:
+            config = yaml.safe_load(file).get('database', {})
+        return cls(
+            max_pool_size=config.get('max_pool_size', 100),
+            min_pool_size=config.get('min_pool_size', 0),
+            max_idle_time_ms=config.get('max_idle_time_ms', 300000),
+            connect_timeout_ms=config.get('connect_timeout_ms', 20000),
+            server_selection_timeout_ms=config.get('server_selection_timeout_ms', 30000),
+            socket_timeout_ms=config.get('socket_timeout_ms', 0),
+            compressors=config.get('compressors', ''),
+            warm_up=config.get('warm_up', False),
+            ensure_indexes=config.get('ensure_indexes', True),
+            slow_query_ms=config.get('slow_query_ms'),
+            explain_slow_queries=config.get('explain_slow_queries', False),
+            stream_batch_size=config.get('stream_batch_size', 500)
+        )
+
+
+@dataclass
+class Cache:
+    max_size: int
+    ttl_seconds: float
+
+    @classmethod
+    def load(cls, cache: str) -> Cache:
+        with open('/app/config/apps.yaml', 'r') as file:
+            config = yaml.safe_load(file).get('caches', {}).get(cache, {})
+        return cls(
+            max_size=config.get('max_size', 1000),
+            ttl_seconds=config.get('ttl_seconds', 60)
+        )
+
+
+@dataclass
+class Purge:
+    enabled: bool
+    interval_seconds: float
+    batch_size: int
+    batch_pause_ms: float
+    sweep_interval_seconds: float
+    sweep_max_documents: int
+    lease_seconds: float
+
+    @classmethod
+    def load(cls) -> Purge:
+        with open('/app/config/apps.yaml', 'r') as file:
+            config = yaml.safe_load(file).get('purge', {})
+        return cls(
+            enabled=config.get('enabled', False),
+            interval_seconds=config.get('interval_seconds', 60),
+            batch_size=config.get('batch_size', 500),
+            batch_pause_ms=config.get('batch_pause_ms', 100),
+            sweep_interval_seconds=config.get('sweep_interval_seconds', 3600),
+            sweep_max_documents=config.get('sweep_max_documents', 50000),
+            lease_seconds=config.get('lease_seconds', 300)
+        )
+
+
+@dataclass
+class Dispatch:
+    enabled: bool
+    workers: int
+    max_queue_size: int
+    batch_size: int
+    flush_interval_ms: float
+
+    @classmethod
+    def load(cls) -> Dispatch:
+        with open('/app/config/apps.yaml', 'r') as file:
+            config = yaml.safe_load(file).get('dispatcher', {})
+        return cls(
+            enabled=config.get('enabled', False),
+            workers=config.get('workers', 1),
+            max_queue_size=config.get('max_queue_size', 1000),
+            batch_size=config.get('batch_size', 50),
+            flush_interval_ms=config.get('flush_interval_ms', 50)
+        )
+
+
+@dataclass
+class Notifications:
+    mode: str
+
+    @classmethod
+    def load(cls) -> Notifications:
+        with open('/app/config/apps.yaml', 'r') as file:
+            config = yaml.safe_load(file).get('notifications', {})
+        return cls(
+            mode=config.get('mode', 'http')
+        )
+
+
+@dataclass
+class Images:
+    max_dimension: int
+    jpeg_quality: int
+    upload_workers: int
+    store: str
+    local_path: str
+    thumbnail_sizes: list[int]
+    cache_max_age: int
+    max_file_bytes: int
+    max_request_bytes: int
+    max_pixels: int
+
+    @classmethod
+    def load(cls) -> Images:
+        with open('/app/config/apps.yaml', 'r') as file:
+            config = yaml.safe_load(file).get('images', {})
+        return cls(
+            max_dimension=config.get('max_dimension', 2048),
+            jpeg_quality=config.get('jpeg_quality', 85),
+            upload_workers=config.get('upload_workers', 4),
+            store=config.get('store', 'imgur'),
+            local_path=config.get('local_path', '/app/images'),
+            thumbnail_sizes=sorted(config.get('thumbnail_sizes', [])),
+            cache_max_age=config.get('cache_max_age', 31536000),
+            max_file_bytes=config.get('max_file_bytes', 20971520),
+            max_request_bytes=config.get('max_request_bytes', 104857600),
+            max_pixels=config.get('max_pixels', 100000000)
+        )
+
+
+@dataclass
+class Qr:
+    cache_path: str
+    batch_workers: int
+    batch_max_codes: int
+
+    @classmethod
+    def load(cls) -> Qr:
+        with open('/app/config/apps.yaml', 'r') as file:
+            config = yaml.safe_load(file).get('qr', {})
+        return cls(
+            cache_path=config.get('cache_path', '/app/qr_cache'),
+            batch_workers=config.get('batch_workers', 0),
+            batch_max_codes=config.get('batch_max_codes', 1000)
+        )
+
+
 class Services:
     CLIENT = Service.load('client')
     CONTROLLER = Service.load('controller')
@@ -39,3 +221,26 @@ class Url:
         return url
 
     IMGUR = load_external_url.__func__('imgur')
+
+
+DATABASE = Database.load()
+
+HTTP = Http.load()
+
+PURGE = Purge.load()
+
+DISPATCH = Dispatch.load()
+
+NOTIFICATIONS = Notifications.load()
+
+IMAGES = Images.load()
+
+QR = Qr.load()
+
+
+class Caches:
+    AUTHORS = Cache.load('authors')
+    USERNAMES = Cache.load('usernames')
+    AUTOCOMPLETE = Cache.load('autocomplete')
+    POST_FRAGMENTS = Cache.load('post_fragments')
+    QR_CODES = Cache.load('qr_codes')
@@ -0,0 +1,122 @@
+'''
+Opaque, signed continuation cursors for keyset pagination.
+
+A cursor encodes the `(timestamp, _id)` of the last returned document, so the
+next page is fetched with `keyset_filter` as an index range scan over
+`(timestamp: -1, _id: -1)`, stable under ties and concurrent inserts.
+
+Relevance ranked search results use `(score, _id, offset)` cursors instead,
+the offset enforces the cap on the total number of results.
+'''
+import os
+import hmac
+import json
+import base64
+import hashlib
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+
+MAX_PAGE_SIZE = 50
+
+_SIGNATURE_SIZE = 16
+
+
+def _sign(payload: bytes) -> bytes:
+    key = os.environ.get('JWT_SECRET_KEY', '').encode('utf-8')
+    return hmac.new(key, payload, hashlib.sha256).digest()[:_SIGNATURE_SIZE]
+
+
+def _encode(values: list) -> str:
+    payload = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    token = payload + _sign(payload)
+    return base64.urlsafe_b64encode(token).decode('ascii').rstrip('=')
+
+
+def _decode(cursor: str, size: int) -> list:
+    try:
+        token = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    except (ValueError, TypeError) as e:
+        raise ValueError('Malformed cursor') from e
+
+    payload, signature = token[:-_SIGNATURE_SIZE], token[-_SIGNATURE_SIZE:]
+    if not payload or not hmac.compare_digest(signature, _sign(payload)):
+        raise ValueError('Invalid cursor signature')
+
+    try:
+        values = json.loads(payload)
+    except ValueError as e:
+        raise ValueError('Malformed cursor') from e
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Malformed cursor')
+    return values
+
+
+def encode_cursor(timestamp: datetime, id: ObjectId | str) -> str:
+    return _encode([timestamp.isoformat(), str(id)])
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    '''
+    Raises `ValueError` if cursor is malformed or its signature does not match.
+    '''
+    timestamp, id = _decode(cursor, 2)
+    try:
+        return datetime.fromisoformat(timestamp), ObjectId(id)
+    except Exception as e:
+        raise ValueError('Malformed cursor') from e
+
+
+def encode_score_cursor(score: float, id: ObjectId | str, offset: int) -> str:
+    return _encode([score, str(id), offset])
+
+
+def decode_score_cursor(cursor: str) -> tuple[float, ObjectId, int]:
+    '''
+    Decode cursor of relevance ranked results into `(score, _id, offset)`.
+    Raises `ValueError` if cursor is malformed or its signature does not match.
+    '''
+    score, id, offset = _decode(cursor, 3)
+    try:
+        return float(score), ObjectId(id), int(offset)
+    except Exception as e:
+        raise ValueError('Malformed cursor') from e
+
+
+def keyset_filter(cursor: tuple[datetime, ObjectId]) -> dict:
+    '''
+    Filter selecting documents strictly after the cursor in `(timestamp: -1, _id: -1)` order.
+    '''
+    timestamp, id = cursor
+    return {
+        '$or': [
+            {'timestamp': {'$lt': timestamp}},
+            {'timestamp': timestamp, '_id': {'$lt': id}},
+        ]
+    }
+
+
+def next_cursor(items: list[dict], limit: int, timestamp_key: str = 'timestamp', id_key: str = 'id') -> str | None:
+    '''
+    Cursor pointing after the last item of a full page, `None` when there are no more pages.
+    '''
+    if len(items) < limit or not items:
+        return None
+
+    last = items[-1]
+    return encode_cursor(last[timestamp_key], last[id_key])
+
+
+def score_keyset_filter(cursor: tuple[float, ObjectId, int]) -> dict:
+    '''
+    Filter selecting documents strictly after the cursor in `(score: -1, _id: -1)` order.
+    '''
+    score, id, _ = cursor
+    return {
+        '$or': [
+            {'score': {'$lt': score}},
+            {'score': score, '_id': {'$lt': id}},
+        ]
+    }
@@ -0,0 +1,167 @@
+'''
+Asynchronous delivery of real-time notifications to the notifier.
+
+Write endpoints `emit` an event and return as soon as it is queued. Worker
+threads drain the bounded queue, collecting up to `batch_size` events or
+whatever arrives within `flush_interval_ms`, and post them to `/emit/batch` of
+the notifier in a single request. Notifications are stored in the recipient's
+inbox before they are emitted, so an event dropped under overload or after a
+failed delivery is only missing from the live socket and is still listed by
+`GET /notification`.
+
+With `notifications.mode: change_stream` the notifier picks the inbox entries up
+from a change stream and nothing is posted.
+'''
+import time
+import logging
+from queue import Queue, Empty, Full
+from threading import Event, Lock, Thread
+
+from .apps import Dispatch, DISPATCH, NOTIFICATIONS, Services
+from .request import send_request
+
+
+log = logging.getLogger('DISPATCHER')
+
+# seconds an idle worker waits for an event before checking whether it is being stopped
+IDLE_WAIT_SECONDS = 0.5
+
+
+class NotificationDispatcher:
+
+    def __init__(self, config: Dispatch):
+        self.config = config
+        self.queue: Queue[tuple[str, dict]] = Queue(maxsize=config.max_queue_size)
+        self.threads: list[Thread] = []
+        self.stop_event = Event()
+        self.lock = Lock()
+        self.counters = {
+            'queued': 0,
+            'sent': 0,
+            'failed': 0,
+            'rejected': 0,
+            'dropped': 0,
+            'batches': 0,
+        }
+
+    def _count(self, counter: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[counter] += value
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                **self.counters,
+                'depth': self.queue.qsize(),
+                'max_depth': self.config.max_queue_size,
+                'workers': sum(thread.is_alive() for thread in self.threads),
+            }
+
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self.threads)
+
+    def emit(self, event: str, data: dict) -> bool:
+        '''
+        Queue `data` as a notification of type `event`, returns `False` if it was dropped.
+        Without running workers the event is sent synchronously.
+        '''
+        if NOTIFICATIONS.mode == 'change_stream':
+            # delivered by the notifier from the inbox entry
+            return True
+
+        if not self.running():
+            return self._send([(event, data)]) == 1
+
+        try:
+            self.queue.put_nowait((event, data))
+        except Full:
+            self._count('dropped')
+            log.warning(f"Notification queue full, dropped {event} event for user_owner_id = {data.get('user_owner_id')}")
+            return False
+
+        self._count('queued')
+        return True
+
+    def _collect(self) -> list[tuple[str, dict]]:
+        '''
+        Wait for the first event, then gather more until the batch is full or the flush interval passes.
+        '''
+        try:
+            batch = [self.queue.get(timeout=IDLE_WAIT_SECONDS)]
+        except Empty:
+            return []
+
+        deadline = time.monotonic() + self.config.flush_interval_ms / 1000
+        while len(batch) < self.config.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _send(self, batch: list[tuple[str, dict]]) -> int:
+        '''
+        Post events of `batch` to the notifier in one request, returns number of delivered ones.
+        Events the notifier rejects as invalid are counted apart from failed deliveries.
+        '''
+        sent = 0
+        rejected = 0
+        json_data = {'events': [{'type': event, 'event': data} for event, data in batch]}
+        try:
+            response = send_request('POST', Services.NOTIFIER, '/emit/batch', json_data=json_data)
+            if response.ok:
+                result = response.json()
+                rejected = len(result.get('rejected') or [])
+                sent = len(batch) - rejected
+                if rejected:
+                    log.info(f"Notifier rejected {rejected} of {len(batch)} events: {result.get('errors')}")
+            else:
+                log.info(f'Notifier rejected batch of {len(batch)} events: {response.status_code} {response.text}')
+        except Exception as e:
+            log.info(f'Error during sending batch of {len(batch)} notifications via websocket: {e}')
+
+        self._count('sent', sent)
+        self._count('rejected', rejected)
+        self._count('failed', len(batch) - sent - rejected)
+        self._count('batches')
+        return sent
+
+    def _run(self) -> None:
+        while not self.stop_event.is_set():
+            batch = self._collect()
+            if batch:
+                self._send(batch)
+
+    def start(self) -> None:
+        if self.running():
+            return
+        self.stop_event.clear()
+        self.threads = [
+            Thread(target=self._run, name=f'notification-dispatcher-{index}', daemon=True)
+            for index in range(self.config.workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self) -> None:
+        '''
+        Stop the workers after their current batch, events left in the queue are sent synchronously.
+        '''
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=IDLE_WAIT_SECONDS + self.config.flush_interval_ms / 1000)
+
+        remaining = []
+        while True:
+            try:
+                remaining.append(self.queue.get_nowait())
+            except Empty:
+                break
+        if remaining:
+            self._send(remaining)
+
+
+dispatcher = NotificationDispatcher(DISPATCH)
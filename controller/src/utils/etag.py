@@ -0,0 +1,35 @@
+'''
+Weak ETags for conditional GET.
+
+Tags are derived from the `version` counters bumped on every write of posts and users
+(missing `version` counts as 0), so an unchanged resource is validated by a cheap
+indexed probe and answered with 304 before the full query runs.
+'''
+import json
+import hashlib
+
+from flask import request
+
+
+def compute_etag(*parts) -> str:
+    '''
+    Opaque tag of JSON-serialisable `parts`, returned unquoted.
+    '''
+    payload = json.dumps(parts, default=str, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()
+
+
+def etag_headers(etag: str) -> dict:
+    # responses depend on the bearer's own reactions, so they must not be shared between users
+    return {
+        'ETag': f'W/"{etag}"',
+        'Cache-Control': 'private, no-cache',
+        'Vary': 'Authorization',
+    }
+
+
+def is_not_modified(etag: str) -> bool:
+    '''
+    Whether `If-None-Match` of the current request matches `etag` (weak comparison).
+    '''
+    return request.if_none_match.contains_weak(etag)
@@ -10,22 +10,30 @@ class DynamicModelField(fields.Raw):
         self.models = models
         super().__init__(*args, **kwargs)
     
-    def format(self, value):
-        """
-        Format the value based on 'notification_type' and use the correct model
-        """
+    @staticmethod
+    def notification_type(value) -> str:
         if 'reaction_type' in value:
-            notification_type = 'reaction'
+            return 'reaction'
         elif 'city' in value:
-            notification_type = 'scan'
+            return 'scan'
         elif 'post_id' in value:
-            notification_type = 'comment'
-        else:
-            raise BadRequest('Invalid data')
+            return 'comment'
+        raise BadRequest('Invalid data')
 
-        model = self.models.get(notification_type)
+    def format(self, value):
+        """
+        Format the value based on 'notification_type' and use the correct model
+        """
+        model = self.models.get(self.notification_type(value))
 
         return marshal(value, model)
+
+    def compile(self, compile_model):
+        """
+        Compiled counterpart of `format` used by `utils.serializer`
+        """
+        encoders = {notification_type: compile_model(model) for notification_type, model in self.models.items()}
+        return lambda value: encoders[self.notification_type(value)](value)
     
     def __call__(self, value, **kwargs):
         '''
@@ -0,0 +1,186 @@
+'''
+Storage backends of uploaded images, selected by `images.store` in apps.yaml.
+
+`ImgurStore` uploads to Imgur. `LocalStore` keeps images on local disk addressed
+by the SHA-256 of their content, so identical images are stored once, and
+generates downscaled variants (`thumbnail_sizes`) at ingest. Locally stored
+images are served by the `images` namespace.
+'''
+import io
+import os
+import re
+import hashlib
+import logging
+import tempfile
+from typing import BinaryIO
+from abc import ABC, abstractmethod
+
+from PIL import Image
+
+from .apps import Images, IMAGES, Services, Url
+from .request import send_request
+
+
+log = logging.getLogger('IMAGE_STORE')
+
+# file extensions of stored images by mimetype
+EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+MIMETYPES = {extension: mimetype for mimetype, extension in EXTENSIONS.items()}
+
+# bytes copied at once from an upload to its file
+CHUNK_SIZE = 64 * 1024
+
+# `<sha256>.<extension>` of an original image, `<sha256>_<width>.<extension>` of its variant
+IMAGE_NAME = re.compile(r'^(?P<digest>[0-9a-f]{64})(?:_(?P<size>\d+))?\.(?P<extension>jpg|png|gif|webp)$')
+
+
+class ImageUploadError(Exception):
+    pass
+
+
+class ImageStore(ABC):
+
+    @abstractmethod
+    def put(self, filename: str, stream: BinaryIO, mimetype: str) -> str:
+        '''
+        Store prepared image read from `stream`, returns its public URL.
+        '''
+
+
+class ImgurStore(ImageStore):
+
+    def put(self, filename: str, stream: BinaryIO, mimetype: str) -> str:
+        # requests encodes the multipart body in memory, its size is bounded by `max_file_bytes`
+        headers = {"Authorization": f"Client-ID {os.environ.get('IMGUR_CLIENT_ID')}"}
+        response = send_request('POST', Url.IMGUR, files={'image': (filename, stream, mimetype)}, headers=headers)
+
+        if response.status_code != 200:
+            raise ImageUploadError(f'Got unexpected response from imgur service: {response}')
+
+        return response.json()['data']['link']
+
+
+class LocalStore(ImageStore):
+
+    def __init__(self, config: Images):
+        self.root = config.local_path
+        self.thumbnail_sizes = config.thumbnail_sizes
+        self.jpeg_quality = config.jpeg_quality
+        service = Services.CONTROLLER
+        self.base_url = f'{service.http}://{service.ip_host}:{service.port}/images'
+
+    def path(self, name: str) -> str:
+        '''
+        Location of stored image `name`, sharded by the first two characters of its digest.
+        '''
+        return os.path.join(self.root, name[:2], name)
+
+    def _write(self, name: str, content: bytes) -> None:
+        '''
+        Write atomically, readers never see a partially written file.
+        '''
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.upload-')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(content)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def _write_variants(self, digest: str, extension: str, source: str) -> None:
+        with Image.open(source) as image:
+            if getattr(image, 'is_animated', False):
+                return
+            # decode JPEGs directly at the smallest scale still larger than the largest variant
+            image.draft('RGB', (max(self.thumbnail_sizes), max(self.thumbnail_sizes)))
+            image.load()
+
+            for size in self.thumbnail_sizes:
+                if size >= max(image.size):
+                    break
+                variant = image.copy()
+                variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+                output = io.BytesIO()
+                if extension == 'jpg':
+                    variant.convert('RGB').save(output, format='JPEG', quality=self.jpeg_quality, optimize=True, progressive=True)
+                else:
+                    variant.save(output, format=image.format, optimize=True)
+                self._write(f'{digest}_{size}.{extension}', output.getvalue())
+
+    def put(self, filename: str, stream: BinaryIO, mimetype: str) -> str:
+        extension = EXTENSIONS.get(mimetype)
+        if extension is None:
+            raise ImageUploadError(f'Unsupported image type {mimetype} of {filename}')
+
+        # hash while copying in chunks, the name is known only after the last one
+        os.makedirs(self.root, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(descriptor, 'wb') as file:
+                while chunk := stream.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    file.write(chunk)
+            digest = digest.hexdigest()
+
+            name = f'{digest}.{extension}'
+            path = self.path(name)
+            if os.path.exists(path):
+                log.info(f'Image {filename} already stored as {name}')
+                os.unlink(temporary)
+            else:
+                if self.thumbnail_sizes:
+                    self._write_variants(digest, extension, temporary)
+                # the original last, its presence marks a complete ingest
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temporary, path)
+
+        except BaseException:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+            raise
+
+        return f'{self.base_url}/{name}'
+
+    def resolve(self, name: str, size: int | None = None) -> tuple[str, str] | None:
+        '''
+        Path and mimetype of stored image `name`, or of its smallest variant at least `size` wide.
+        `None` if there is no such image.
+        '''
+        match = IMAGE_NAME.match(name)
+        if not match or match['size']:
+            return None
+
+        path = self.path(name)
+        if size is not None:
+            for variant_size in self.thumbnail_sizes:
+                if variant_size >= size:
+                    variant = self.path(f"{match['digest']}_{variant_size}.{match['extension']}")
+                    if os.path.exists(variant):
+                        path = variant
+                    break
+
+        if not os.path.exists(path):
+            return None
+        return path, MIMETYPES[match['extension']]
+
+
+def create_store(config: Images) -> ImageStore:
+    match config.store:
+        case 'imgur':
+            return ImgurStore()
+        case 'local':
+            return LocalStore(config)
+    raise ValueError(f'Unknown image store {config.store}')
+
+
+store = create_store(IMAGES)
@@ -0,0 +1,152 @@
+'''
+Preparation and upload of user images to the configured `ImageStore`.
+
+Every image is decoded once with Pillow, rotated by its EXIF orientation,
+downscaled to fit `max_dimension` and recompressed, so the store receives a
+fraction of the bytes of a camera photo. Uploads are read from the temporary
+files Werkzeug spools them to and are never held in memory whole. Images of one
+request are prepared and stored concurrently on a thread pool shared by the
+whole process, which bounds the number of parallel connections to Imgur.
+'''
+import io
+import os
+import logging
+from typing import BinaryIO
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import ExifTags, Image, ImageOps, UnidentifiedImageError
+from werkzeug.datastructures import FileStorage
+
+from .apps import IMAGES
+from .image_store import ImageUploadError, store
+
+
+log = logging.getLogger('IMAGES')
+
+_executor = ThreadPoolExecutor(max_workers=IMAGES.upload_workers, thread_name_prefix='image-upload')
+
+# Pillow raises `DecompressionBombError` before decoding images with over twice this many pixels
+Image.MAX_IMAGE_PIXELS = IMAGES.max_pixels // 2
+
+# formats accepted by `Image.open`, their leading bytes are checked by `check_upload`
+FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+
+class InvalidImageError(ImageUploadError):
+    pass
+
+
+class ImageTooLargeError(ImageUploadError):
+    pass
+
+
+def sniff_format(header: bytes) -> str | None:
+    '''
+    Image format recognised from the first 12 bytes of a file.
+    '''
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'GIF'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def check_upload(file: FileStorage) -> int:
+    '''
+    Size of uploaded file, rejected before it is decoded when too large or not an image.
+    Werkzeug spools uploads to a temporary file, the size is found by seeking.
+    '''
+    stream = file.stream
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+
+    if size > IMAGES.max_file_bytes:
+        raise ImageTooLargeError(f'Image {file.filename} has {size} bytes, at most {IMAGES.max_file_bytes} are accepted')
+
+    header = stream.read(12)
+    stream.seek(0)
+    if sniff_format(header) is None:
+        raise InvalidImageError(f'File {file.filename} is not a JPEG, PNG, GIF or WebP image')
+
+    return size
+
+
+def prepare_image(file: FileStorage) -> tuple[str, BinaryIO, str]:
+    '''
+    Downscaled and recompressed image as `(filename, stream, mimetype)` for the image store.
+    Animated images and images which would not get smaller are passed as the uploaded stream.
+    '''
+    size = check_upload(file)
+    stream = file.stream
+    filename = file.filename or 'image'
+    name = os.path.splitext(filename)[0]
+
+    try:
+        with Image.open(stream, formats=FORMATS) as image:
+            mimetype = Image.MIME.get(image.format, 'application/octet-stream')
+            if getattr(image, 'is_animated', False):
+                stream.seek(0)
+                return filename, stream, mimetype
+
+            rotated = image.getexif().get(ExifTags.Base.Orientation, 1) != 1
+            resized = max(image.size) > IMAGES.max_dimension
+            # JPEGs are decoded directly at the smallest DCT scale still covering `max_dimension`
+            image.draft('RGB', (IMAGES.max_dimension, IMAGES.max_dimension))
+
+            transposed = ImageOps.exif_transpose(image)
+            transposed.thumbnail((IMAGES.max_dimension, IMAGES.max_dimension), Image.Resampling.LANCZOS)
+
+            output = io.BytesIO()
+            if transposed.mode in ('RGBA', 'LA') or (transposed.mode == 'P' and 'transparency' in transposed.info):
+                transposed.save(output, format='PNG', optimize=True)
+                prepared = (f'{name}.png', output, 'image/png')
+            else:
+                transposed.convert('RGB').save(output, format='JPEG', quality=IMAGES.jpeg_quality, optimize=True, progressive=True)
+                prepared = (f'{name}.jpg', output, 'image/jpeg')
+
+            if not resized and not rotated and output.tell() >= size:
+                stream.seek(0)
+                return filename, stream, mimetype
+
+            output.seek(0)
+            return prepared
+
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise InvalidImageError(f'Cannot decode image {file.filename}: {e}') from e
+
+
+def upload_image(file: FileStorage) -> str:
+    '''
+    Prepare and store one image, returns its public URL.
+    '''
+    filename, stream, mimetype = prepare_image(file)
+    url = store.put(filename, stream, mimetype)
+
+    log.info(f'Stored {filename} as {url}')
+    return url
+
+
+def upload_images(files: list[FileStorage]) -> list[str]:
+    '''
+    Upload images concurrently, returns their URLs in the order of `files`.
+    All files are checked before any upload starts, the first failure is raised after all uploads finish.
+    '''
+    for file in files:
+        check_upload(file)
+
+    futures = [_executor.submit(upload_image, file) for file in files]
+    links = []
+    error = None
+    for future in futures:
+        try:
+            links.append(future.result())
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        raise error
+    return links
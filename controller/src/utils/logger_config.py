@@ -1,5 +1,5 @@
 import logging 
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import TimedRotatingFileHandler, RotatingFileHandler
 
 from flask.logging import default_handler
 
@@ -18,3 +18,9 @@ def config_logger(app, level=0):
 
     werkzeug_logger = logging.getLogger('werkzeug')
     werkzeug_logger.setLevel(level)
+
+    slow_query_handler = RotatingFileHandler('/app/logs/slow_queries.log', maxBytes=10 * 1024 * 1024, backupCount=5)
+    slow_query_handler.setFormatter(formatter)
+    slow_query_logger = logging.getLogger('SLOW_QUERY')
+    slow_query_logger.addHandler(slow_query_handler)
+    slow_query_logger.propagate = False
@@ -0,0 +1,38 @@
+'''
+Newline delimited JSON streaming for `flask.Response`.
+'''
+import json
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from bson.objectid import ObjectId
+
+
+MIMETYPE = 'application/x-ndjson'
+
+# flush once this many bytes are buffered, so records are not written one syscall each
+CHUNK_SIZE = 64 * 1024
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def ndjson_stream(records: Iterable[dict], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    chunk = []
+    size = 0
+    for record in records:
+        line = json.dumps(record, default=_default, separators=(',', ':')).encode('utf-8') + b'\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield b''.join(chunk)
+            chunk = []
+            size = 0
+
+    if chunk:
+        yield b''.join(chunk)
@@ -0,0 +1,176 @@
+'''
+Deterministic QR codes of user profiles.
+
+A QR code depends only on the redirecter URL of the user, the render options and
+`RENDER_VERSION`, so rendered codes are cached in memory (`caches.qr_codes`) and
+persisted on disk (`qr.cache_path`) under the hash of these inputs. The hash is
+also the ETag of the code. Bump `RENDER_VERSION` when rendering changes.
+'''
+from __future__ import annotations
+
+import io
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from dataclasses import dataclass, asdict
+
+import qrcode
+from qrcode.image.svg import SvgPathImage
+
+from .apps import Caches, Services, QR
+from ..database.cache import LRUCache
+
+
+log = logging.getLogger('QR')
+
+RENDER_VERSION = 1
+
+ERROR_CORRECTIONS = {
+    'L': qrcode.constants.ERROR_CORRECT_L,
+    'M': qrcode.constants.ERROR_CORRECT_M,
+    'Q': qrcode.constants.ERROR_CORRECT_Q,
+    'H': qrcode.constants.ERROR_CORRECT_H,
+}
+
+MIMETYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+MAX_BOX_SIZE = 40
+MAX_BORDER = 16
+
+
+@dataclass(frozen=True)
+class QrOptions:
+    format: str = 'png'
+    box_size: int = 10
+    border: int = 4
+    error_correction: str = 'L'
+
+    @classmethod
+    def from_args(cls, args) -> QrOptions:
+        '''
+        Options from query arguments, raises `ValueError` when not an integer or out of range.
+        '''
+        try:
+            box_size = int(args.get('box_size', cls.box_size))
+            border = int(args.get('border', cls.border))
+        except (TypeError, ValueError):
+            raise ValueError('Box size and border must be integers')
+
+        options = cls(
+            format=args.get('format', cls.format).lower(),
+            box_size=box_size,
+            border=border,
+            error_correction=args.get('error_correction', cls.error_correction).upper()
+        )
+        if options.format not in MIMETYPES:
+            raise ValueError(f"Format must be one of {', '.join(MIMETYPES)}")
+        if not 1 <= options.box_size <= MAX_BOX_SIZE:
+            raise ValueError(f'Box size must be between 1 and {MAX_BOX_SIZE}')
+        if not 0 <= options.border <= MAX_BORDER:
+            raise ValueError(f'Border must be between 0 and {MAX_BORDER}')
+        if options.error_correction not in ERROR_CORRECTIONS:
+            raise ValueError(f"Error correction must be one of {', '.join(ERROR_CORRECTIONS)}")
+        return options
+
+    @property
+    def mimetype(self) -> str:
+        return MIMETYPES[self.format]
+
+
+def profile_url(user_id: str) -> str:
+    '''
+    Redirecter page of the user encoded in the QR code.
+    '''
+    service = Services.REDIRECTER
+    return f'{service.http}://{service.ip_host}:{service.port}/pet-book/?id={user_id}'
+
+
+def qr_key(user_id: str, options: QrOptions) -> str:
+    data = json.dumps([RENDER_VERSION, profile_url(user_id), asdict(options)], sort_keys=True)
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+def render_qr(data: str, options: QrOptions) -> bytes:
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=ERROR_CORRECTIONS[options.error_correction],
+        box_size=options.box_size,
+        border=options.border,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    output = io.BytesIO()
+    if options.format == 'svg':
+        qr.make_image(image_factory=SvgPathImage).save(output)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(output, format="PNG")
+    return output.getvalue()
+
+
+class QrCodeCache:
+    '''
+    Rendered QR codes kept in a LRU cache in memory and in files named by their key.
+    '''
+
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self.memory = LRUCache(Caches.QR_CODES)
+
+    def _path(self, key: str, options: QrOptions) -> str:
+        return os.path.join(self.cache_path, key[:2], f'{key}.{options.format}')
+
+    def _read(self, path: str) -> bytes | None:
+        try:
+            with open(path, 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, path: str, content: bytes) -> None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.qr-')
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(content)
+            os.replace(temporary, path)
+        except OSError as e:
+            # the code is still served, only rendered again after a restart
+            log.warning(f'Cannot persist QR code {path}: {e}')
+
+    def lookup(self, key: str, options: QrOptions) -> bytes | None:
+        '''
+        Cached content of the QR code with `key`, from memory or from disk.
+        '''
+        content = self.memory.get(key)
+        if content is None:
+            content = self._read(self._path(key, options))
+            if content is not None:
+                self.memory.set(key, content)
+        return content
+
+    def store(self, key: str, options: QrOptions, content: bytes) -> None:
+        self._write(self._path(key, options), content)
+        self.memory.set(key, content)
+
+    def get(self, user_id: str, options: QrOptions) -> tuple[str, bytes]:
+        '''
+        Key and content of the QR code of the user, rendered only if not cached.
+        '''
+        key = qr_key(user_id, options)
+        content = self.lookup(key, options)
+        if content is None:
+            content = render_qr(profile_url(user_id), options)
+            self.store(key, options, content)
+        return key, content
+
+    def stats(self) -> dict:
+        return self.memory.stats()
+
+
+qr_codes = QrCodeCache(QR.cache_path)
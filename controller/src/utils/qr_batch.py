@@ -0,0 +1,287 @@
+'''
+Bulk QR codes for printing pet tags.
+
+Codes missing from `qr_codes` are rendered on an opt-in pool of forked processes
+(`qr.batch_workers`) with a bounded number of codes in flight, and the output is
+produced file by file or page by page as the codes arrive, so a batch is never
+held in memory whole. The workers are forked by `start_pool` while the process
+still has a single thread, a child forked later could inherit a lock held by
+another thread and deadlock. Spawned workers are not an option, they would import
+the whole application again. Without a pool, disabled or broken, codes are
+rendered in the request thread:
+
+- `zip`: one image per user, PNG or SVG
+- `pdf`: A4 pages of labelled codes
+- `sheets`: the same pages as PNG images in a ZIP
+'''
+import io
+import re
+import zlib
+import zipfile
+import logging
+import multiprocessing
+from threading import Lock
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Iterator
+
+from PIL import Image, ImageDraw, ImageFont
+
+from .apps import QR
+from .qr import QrOptions, profile_url, qr_key, qr_codes, render_qr
+
+
+log = logging.getLogger('QR_BATCH')
+
+OUTPUTS = {
+    'zip': ('application/zip', 'zip'),
+    'pdf': ('application/pdf', 'pdf'),
+    'sheets': ('application/zip', 'zip'),
+}
+
+# A4 page at 150 dpi with a grid of labelled codes
+PAGE_DPI = 150
+PAGE_SIZE = (1240, 1754)
+PAGE_MARGIN = 60
+COLUMNS = 4
+ROWS = 5
+CELL_SIZE = ((PAGE_SIZE[0] - 2 * PAGE_MARGIN) // COLUMNS, (PAGE_SIZE[1] - 2 * PAGE_MARGIN) // ROWS)
+CODE_SIZE = CELL_SIZE[0] - 30
+LABEL_OFFSET = 6
+
+CODES_PER_PAGE = COLUMNS * ROWS
+
+# codes submitted to the pool per worker ahead of the one being written
+IN_FLIGHT_PER_WORKER = 4
+
+# characters of usernames kept in file names inside the ZIP
+UNSAFE_FILENAME = re.compile(r'[^A-Za-z0-9._-]+')
+
+_executor: ProcessPoolExecutor | None = None
+_executor_workers = 0
+_executor_lock = Lock()
+
+
+def start_pool(workers: int = QR.batch_workers) -> None:
+    '''
+    Fork `workers` rendering processes, none by default (`qr.batch_workers: 0`).
+    Call before any thread is started, at the top of the application setup.
+    '''
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is not None or workers <= 0:
+            return
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+        _executor_workers = workers
+        # a fork pool launches all of its workers on the first submit, not lazily later
+        _executor.submit(int)
+        log.info(f'Started QR rendering pool of {workers} processes')
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    '''
+    Stop using a pool broken by a dead worker, it is not replaced as forking now is not safe.
+    '''
+    global _executor
+    with _executor_lock:
+        if _executor is pool:
+            _executor = None
+            log.error('QR rendering pool is broken, rendering codes in request threads')
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _render(user_id: str, options: QrOptions) -> bytes | Future:
+    '''
+    Future of the code rendered on the pool, or the code itself without a pool.
+    '''
+    pool = _executor
+    if pool is not None:
+        try:
+            return pool.submit(render_qr, profile_url(user_id), options)
+        except BrokenProcessPool:
+            _discard_pool(pool)
+    return render_qr(profile_url(user_id), options)
+
+
+def code_filename(user_id: str, labels: dict[str, str]) -> str:
+    label = UNSAFE_FILENAME.sub('_', labels.get(user_id, '')).strip('._')
+    return f'{label}-{user_id}' if label else user_id
+
+
+def page_count(codes: int) -> int:
+    return -(-codes // CODES_PER_PAGE)
+
+
+def render_codes(user_ids: Iterable[str], options: QrOptions, cache: bool = True) -> Iterator[tuple[str, bytes]]:
+    '''
+    `(user id, content)` of QR codes in the order of `user_ids`. Cached codes are
+    served directly, at most `IN_FLIGHT_PER_WORKER` others per worker are rendered at the same time.
+    '''
+    in_flight = IN_FLIGHT_PER_WORKER * max(_executor_workers, 1)
+    pending: deque[tuple[str, str, bytes | Future]] = deque()
+
+    def resolve(user_id: str, key: str, result: bytes | Future) -> tuple[str, bytes]:
+        if isinstance(result, Future):
+            try:
+                result = result.result()
+            except BrokenProcessPool:
+                pool = _executor
+                if pool is not None:
+                    _discard_pool(pool)
+                result = render_qr(profile_url(user_id), options)
+            if cache:
+                qr_codes.store(key, options, result)
+        return user_id, result
+
+    for user_id in user_ids:
+        key = qr_key(user_id, options)
+        content = qr_codes.lookup(key, options) if cache else None
+        if content is None:
+            content = _render(user_id, options)
+            if cache and not isinstance(content, Future):
+                qr_codes.store(key, options, content)
+        pending.append((user_id, key, content))
+
+        while pending and (len(pending) >= in_flight or not isinstance(pending[0][2], Future) or pending[0][2].done()):
+            yield resolve(*pending.popleft())
+
+    while pending:
+        yield resolve(*pending.popleft())
+
+
+class _ChunkWriter(io.RawIOBase):
+    '''
+    Unseekable file collecting written bytes until they are drained into the response.
+    '''
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_zip(files: Iterable[tuple[str, bytes]]) -> Iterator[bytes]:
+    '''
+    ZIP archive of `(name, content)` files, written with data descriptors so it needs no seeking.
+    Images are already compressed, so they are stored.
+    '''
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, 'w', zipfile.ZIP_STORED) as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+            yield writer.drain()
+    yield writer.drain()
+
+
+def sheet_pages(codes: Iterable[tuple[str, bytes]], labels: dict[str, str]) -> Iterator[Image.Image]:
+    '''
+    Grayscale pages with `CODES_PER_PAGE` PNG codes, each labelled with the username.
+    '''
+    font = ImageFont.load_default()
+    page = draw = None
+
+    for index, (user_id, content) in enumerate(codes):
+        slot = index % CODES_PER_PAGE
+        if slot == 0:
+            if page is not None:
+                yield page
+            page = Image.new('L', PAGE_SIZE, 255)
+            draw = ImageDraw.Draw(page)
+
+        left = PAGE_MARGIN + slot % COLUMNS * CELL_SIZE[0]
+        top = PAGE_MARGIN + slot // COLUMNS * CELL_SIZE[1]
+        with Image.open(io.BytesIO(content)) as code:
+            code = code.convert('L').resize((CODE_SIZE, CODE_SIZE), Image.Resampling.NEAREST)
+        page.paste(code, (left + (CELL_SIZE[0] - CODE_SIZE) // 2, top))
+
+        label = labels.get(user_id, user_id)
+        draw.text((left + (CELL_SIZE[0] - draw.textlength(label, font=font)) // 2, top + CODE_SIZE + LABEL_OFFSET), label, fill=0, font=font)
+
+    if page is not None:
+        yield page
+
+
+def stream_png_sheets(pages: Iterable[Image.Image]) -> Iterator[bytes]:
+    def files() -> Iterator[tuple[str, bytes]]:
+        for number, page in enumerate(pages, 1):
+            output = io.BytesIO()
+            page.save(output, format='PNG', optimize=True, dpi=(PAGE_DPI, PAGE_DPI))
+            yield f'sheet-{number:03}.png', output.getvalue()
+
+    return stream_zip(files())
+
+
+def stream_pdf(pages: Iterable[Image.Image], pages_total: int) -> Iterator[bytes]:
+    '''
+    PDF with one full-page grayscale image per page, written object by object.
+    Objects: 1 catalog, 2 page tree, then page, content and image of every page.
+    '''
+    width = PAGE_SIZE[0] * 72 / PAGE_DPI
+    height = PAGE_SIZE[1] * 72 / PAGE_DPI
+    offsets: dict[int, int] = {}
+    position = 0
+
+    def write(number: int, body: bytes) -> bytes:
+        nonlocal position
+        data = f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+        offsets[number] = position
+        position += len(data)
+        return data
+
+    def stream(dictionary: str, data: bytes) -> bytes:
+        return f'<< {dictionary} /Length {len(data)} >>\nstream\n'.encode() + data + b'\nendstream'
+
+    header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    position = len(header)
+    yield header
+
+    for index, page in enumerate(pages):
+        page_number = 3 + 3 * index
+        content = f'q {width:.2f} 0 0 {height:.2f} 0 0 cm /Im0 Do Q'.encode()
+        image = zlib.compress(page.tobytes())
+
+        yield write(page_number, (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.2f} {height:.2f}] '
+            f'/Resources << /XObject << /Im0 {page_number + 2} 0 R >> >> /Contents {page_number + 1} 0 R >>'
+        ).encode())
+        yield write(page_number + 1, stream('', content))
+        yield write(page_number + 2, stream(
+            f'/Type /XObject /Subtype /Image /Width {page.width} /Height {page.height} '
+            f'/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode',
+            image
+        ))
+
+    kids = ' '.join(f'{3 + 3 * index} 0 R' for index in range(pages_total))
+    yield write(2, f'<< /Type /Pages /Kids [{kids}] /Count {pages_total} >>'.encode())
+    yield write(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+
+    size = 3 + 3 * pages_total
+    xref = [f'xref\n0 {size}\n', '0000000000 65535 f \n']
+    xref += [f'{offsets[number]:010} 00000 n \n' for number in range(1, size)]
+    xref.append(f'trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{position}\n%%EOF\n')
+    yield ''.join(xref).encode()
+
+
+def stream_batch(output: str, user_ids: list[str], options: QrOptions, labels: dict[str, str]) -> Iterator[bytes]:
+    '''
+    Chunks of the `output` document with QR codes of `user_ids`.
+    '''
+    if output == 'zip':
+        codes = render_codes(user_ids, options)
+        return stream_zip((f'{code_filename(user_id, labels)}.{options.format}', content) for user_id, content in codes)
+
+    pages = sheet_pages(render_codes(user_ids, options), labels)
+    if output == 'pdf':
+        return stream_pdf(pages, page_count(len(user_ids)))
+    return stream_png_sheets(pages)
@@ -1,16 +1,69 @@
+from threading import Lock
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .apps import Service, HTTP
+
+
+# methods safe to repeat after the request may have reached the server
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'})
+
+_sessions: dict[str, requests.Session] = {}
+_sessions_lock = Lock()
 
-from .apps import Service
 
+def _session(base_url: str) -> requests.Session:
+    '''
+    Keep-alive session of one target (scheme and host), created on first use and shared by all threads.
+    Connection failures are retried for any method, responses and read errors only for idempotent ones.
+    '''
+    session = _sessions.get(base_url)
+    if session is not None:
+        return session
 
-def send_request(method: str, to: Service | str, endpoint = '/', json_data={}, files={}, json_input=True, json_output=True, headers={}, timeout=30) -> requests.Response:
+    with _sessions_lock:
+        session = _sessions.get(base_url)
+        if session is None:
+            retry = Retry(
+                total=HTTP.retries,
+                connect=HTTP.retries,
+                read=HTTP.retries,
+                status=HTTP.retries,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=IDEMPOTENT_METHODS,
+                backoff_factor=HTTP.backoff_factor,
+                backoff_jitter=HTTP.backoff_jitter,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=HTTP.pool_connections, pool_maxsize=HTTP.pool_maxsize, max_retries=retry)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[base_url] = session
+    return session
+
+
+def send_request(method: str, to: Service | str, endpoint = '/', json_data={}, files={}, json_input=True, json_output=True, headers={}, timeout=None) -> requests.Response:
+    '''
+    :param timeout: Seconds, or `(connect, read)` tuple, defaults to `http` timeouts of apps.yaml
+    '''
     if isinstance(to, Service):
-        url = f'{to.http}://{to.ip}:{to.port}{endpoint}'
+        base_url = f'{to.http}://{to.ip}:{to.port}'
+        url = f'{base_url}{endpoint}'
     else:
         url = f'{to}{endpoint}'
+        parts = urlsplit(url)
+        base_url = f'{parts.scheme}://{parts.netloc}'
+
+    session = _session(base_url)
+    if timeout is None:
+        timeout = (HTTP.connect_timeout_seconds, HTTP.read_timeout_seconds)
 
     if files:
-        response = requests.post(url, files=files, timeout=timeout, headers=headers)
+        response = session.post(url, files=files, timeout=timeout, headers=headers)
     else:
         if not headers:
             headers = {}
@@ -18,15 +71,17 @@ def send_request(method: str, to: Service | str, endpoint = '/', json_data={}, f
                 headers['Content-Type'] = 'application/json'
             if json_output:
                 headers['Accept'] = 'application/json'
-    
+        else:
+            headers = dict(headers)
+
         match method:
             case 'GET':
-                if headers.keys().get('Content-Type') == 'application/json':
+                if headers.get('Content-Type') == 'application/json':
                     headers.pop('Content-Type')
-                response = requests.get(url, params=json_data, timeout=timeout, headers=headers)
+                response = session.get(url, params=json_data, timeout=timeout, headers=headers)
             case 'POST':
-                response = requests.post(url, json=json_data, timeout=timeout, headers=headers)
+                response = session.post(url, json=json_data, timeout=timeout, headers=headers)
             case 'PUT':
-                response = requests.put(url, params=json_data, timeout=timeout, headers=headers)
-    
+                response = session.put(url, params=json_data, timeout=timeout, headers=headers)
+
     return response
@@ -0,0 +1,22 @@
+'''
+Sanitising of user input for MongoDB `$text` search.
+'''
+import re
+
+
+# maximal number of terms passed to `$text`, longer queries are truncated
+MAX_SEARCH_TERMS = 10
+
+# maximal number of results served for one query across all pages
+MAX_SEARCH_RESULTS = 200
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+def text_search(search_term: str) -> str:
+    '''
+    Reduce raw input to plain space separated words, so the phrase (`"..."`) and negation (`-word`)
+    operators of `$text` cannot be injected. Returns an empty string if there is nothing to search for.
+    '''
+    terms = _TERM.findall(search_term or '')
+    return ' '.join(terms[:MAX_SEARCH_TERMS])
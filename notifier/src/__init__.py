@@ -8,6 +8,9 @@ from flask_cors import CORS
 
 from .utils.websocket import Websocket
 from .utils.logger_config import config_logger
+from .utils.apps import DATABASE, NOTIFICATIONS
+from .database import MongoDBConnect
+from .database.stream import notification_stream
 
 
 app = Flask(__name__)
@@ -22,6 +25,11 @@ api = Api(blueprint, version = '1.0.0', title = 'PetBook Notifier API')
 
 socketio = Websocket(app)
 
+if NOTIFICATIONS.mode == 'change_stream':
+    if DATABASE.warm_up:
+        MongoDBConnect.warm_up()
+    notification_stream.start()
+
 
 from .endpoints.emit import api as http
 
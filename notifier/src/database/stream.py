@@ -0,0 +1,147 @@
+'''
+Change stream driven delivery of notifications (`notifications.mode: change_stream`).
+
+The controller writes an inbox entry to `notifications` for every scan, comment
+and reaction, with the owner already resolved. Instead of waiting for the
+controller to post each event, the notifier tails that collection and emits new
+entries to the owner's room, so delivery latency is the commit latency. The
+resume token is saved in `notifier_state`, after a restart delivery continues
+where it stopped (entries after the last checkpoint may be emitted twice).
+Change streams need a replica set, a single node one is enough.
+'''
+import time
+import logging
+from typing import Callable
+
+from bson.objectid import ObjectId
+from flask_socketio import SocketIO
+from pymongo.errors import OperationFailure, PyMongoError
+
+from . import MongoDBConnect
+from ..utils.apps import Notifications, NOTIFICATIONS
+from ..utils.websocket import Websocket
+
+
+log = logging.getLogger('STREAM')
+
+# `_id` of the resume token document in `notifier_state`
+STATE_ID = 'notifications'
+
+# server errors of a resume token which is no longer in the oplog
+# (InvalidResumeToken, ChangeStreamFatalError, ChangeStreamHistoryLost)
+HISTORY_LOST_CODES = {260, 280, 286}
+
+# new inbox entries, `replace` is a reaction changing its type
+PIPELINE = [{'$match': {'operationType': {'$in': ['insert', 'replace']}}}]
+
+
+def notification_event(document: dict) -> tuple[str, str, dict]:
+    '''
+    Owner, Socket.IO event and payload of an inbox entry, the same as emitted by `/emit/<type>`.
+    '''
+    document = dict(document)
+    owner_id = str(document.pop('owner_id'))
+    notification_type = document.pop('notification_type')
+    json_data = {
+        'notification_id': str(document.pop('_id')),
+        'timestamp': str(document.pop('timestamp', '')),
+        'notification_type': notification_type,
+        'data': {key: str(value) if isinstance(value, ObjectId) else value for key, value in document.items()},
+    }
+    return owner_id, f'notification_{notification_type}', json_data
+
+
+class NotificationStream:
+
+    def __init__(self, config: Notifications):
+        self.config = config
+        self.stopped = False
+
+    def _blocking(self, socketio: SocketIO, func: Callable, *args, **kwargs):
+        '''
+        Run blocking pymongo call `func` without stalling other green threads of the server.
+        '''
+        if socketio.async_mode == 'eventlet':
+            from eventlet import tpool
+            return tpool.execute(func, *args, **kwargs)
+        return func(*args, **kwargs)
+
+    def _save_token(self, socketio: SocketIO, db, token: dict | None) -> None:
+        self._blocking(
+            socketio,
+            db['notifier_state'].update_one,
+            {'_id': STATE_ID},
+            {'$set': {'resume_token': token, 'updated_at': time.time()}},
+            upsert=True
+        )
+
+    def _emit(self, socket: Websocket, document: dict) -> None:
+        owner_id, event, json_data = notification_event(document)
+        if socket.is_connected(owner_id):
+            socket.emit(event, json_data, room=owner_id)
+
+    def _tail(self, socket: Websocket) -> None:
+        socketio = socket.app
+        db = MongoDBConnect().db
+
+        state = self._blocking(socketio, db['notifier_state'].find_one, {'_id': STATE_ID}) or {}
+        saved_token = state.get('resume_token')
+        log.info(f"Tailing notifications {'from saved resume token' if saved_token else 'from now'}")
+
+        stream = self._blocking(
+            socketio,
+            db['notifications'].watch,
+            PIPELINE,
+            resume_after=saved_token,
+            max_await_time_ms=self.config.max_await_ms
+        )
+        with stream:
+            saved_at = time.monotonic()
+            while not self.stopped:
+                change = self._blocking(socketio, stream.try_next)
+                if change is not None and change.get('fullDocument'):
+                    self._emit(socket, change['fullDocument'])
+
+                token = stream.resume_token
+                if token != saved_token and time.monotonic() - saved_at >= self.config.checkpoint_seconds:
+                    self._save_token(socketio, db, token)
+                    saved_token = token
+                    saved_at = time.monotonic()
+
+                if change is None:
+                    # let other green threads run between idle polls
+                    socketio.sleep(0)
+
+    def run(self) -> None:
+        '''
+        Background task of the Socket.IO server, reconnects after failures until stopped.
+        '''
+        socket = Websocket()
+        while not self.stopped:
+            try:
+                self._tail(socket)
+            except OperationFailure as e:
+                if e.code in HISTORY_LOST_CODES:
+                    log.warning(f'Resume token is no longer valid, tailing from now: {e}')
+                    try:
+                        self._save_token(socket.app, MongoDBConnect().db, None)
+                        continue
+                    except PyMongoError as e:
+                        log.error(f'Cannot reset resume token: {e}')
+                else:
+                    log.error(f'Change stream failed: {e}')
+            except PyMongoError as e:
+                log.error(f'Change stream interrupted: {e}')
+            except Exception as e:
+                log.error(f'Unexpected error while tailing notifications: {e}')
+            socket.app.sleep(self.config.retry_seconds)
+
+    def start(self) -> None:
+        self.stopped = False
+        Websocket().app.start_background_task(self.run)
+
+    def stop(self) -> None:
+        self.stopped = True
+
+
+notification_stream = NotificationStream(NOTIFICATIONS)
@@ -1,7 +1,9 @@
 import logging
+from collections import defaultdict
 
 from flask import request
 from flask_restx import Resource, fields, Namespace
+from jsonschema import Draft4Validator
 
 from ..utils.websocket import Websocket 
 
@@ -70,6 +72,52 @@ comment_input_model = api.model(
     }
 )
 
+# input model of each notification type accepted by `/emit/batch`
+EVENT_MODELS = {
+    'scan': scan_input_model,
+    'reaction': reaction_input_model,
+    'comment': comment_input_model,
+}
+
+batch_event_model = api.model(
+    'Batch event model',
+    {
+        'type': fields.String(required=True, description=f"Type of the notification: {', '.join(EVENT_MODELS)}"),
+        'event': fields.Raw(required=True, description='Notification in the input model of its type'),
+    }
+)
+
+batch_input_model = api.model(
+    'Batch input model',
+    {
+        'events': fields.List(fields.Nested(batch_event_model), required=True, description='Notifications of mixed types'),
+    }
+)
+
+batch_output_model = api.model(
+    'Batch output model',
+    {
+        'emitted': fields.Integer(description='Number of notifications emitted to connected users'),
+        'rejected': fields.List(fields.Integer, description='Indexes of events which failed validation and were not emitted'),
+        'errors': fields.Raw(description='Validation errors of rejected events by field path'),
+    }
+)
+
+_validators: dict[str, Draft4Validator] = {}
+
+
+def event_validator(api, notification_type: str) -> Draft4Validator:
+    '''
+    Validator of the input model of `notification_type`, built once instead of per request.
+    '''
+    validator = _validators.get(notification_type)
+    if validator is None:
+        validator = Draft4Validator(
+            EVENT_MODELS[notification_type].__schema__, resolver=api.refresolver, format_checker=api.format_checker
+        )
+        _validators[notification_type] = validator
+    return validator
+
 
 @api.route('/scan')
 class Scan(Resource):
@@ -126,3 +174,57 @@ class Comment(Resource):
             socket.emit('notification_comment', json_data, room=user_id)
 
         return {}, 200
+
+
+@api.route('/batch')
+class Batch(Resource):
+    @api.expect(batch_input_model, validate=True)
+    @api.marshal_with(batch_output_model, code=200)
+    @api.response(200, 'OK')
+    @api.response(400, 'Bad Request')
+    def post(self):
+        '''
+        Emit notifications of mixed types, grouped by the room of their owner.
+        Events are validated one by one, invalid ones are reported and the rest is still emitted.
+        '''
+        events = request.get_json()['events']
+
+        valid = []
+        rejected = []
+        errors = {}
+        for index, item in enumerate(events):
+            event_errors = {}
+            model = EVENT_MODELS.get(item['type'])
+            if model is None:
+                event_errors[f'events.{index}.type'] = f"'{item['type']}' is not one of {list(EVENT_MODELS)}"
+            else:
+                for error in event_validator(self.api, item['type']).iter_errors(item['event']):
+                    key, message = model.format_error(error)
+                    event_errors[f'events.{index}.event{"." if key else ""}{key}'] = message
+
+            if event_errors:
+                errors.update(event_errors)
+                rejected.append(index)
+            else:
+                valid.append(item)
+
+        if rejected:
+            log.warning(f'Rejected {len(rejected)} of {len(events)} notifications: {errors}')
+
+        rooms = defaultdict(list)
+        for item in valid:
+            json_data = dict(item['event'])
+            user_id = json_data.pop('user_owner_id')
+            json_data['notification_type'] = item['type']
+            rooms[user_id].append((f"notification_{item['type']}", json_data))
+
+        socket = Websocket()
+
+        emitted = 0
+        for user_id in socket.connected(rooms):
+            for event, json_data in rooms[user_id]:
+                socket.emit(event, json_data, room=user_id)
+            emitted += len(rooms[user_id])
+
+        log.info(f'Emitted {emitted} of {len(valid)} notifications to {len(rooms)} rooms')
+        return {'emitted': emitted, 'rejected': rejected, 'errors': errors}, 200
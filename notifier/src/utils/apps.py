@@ -23,6 +23,77 @@ class Service:
         )
 
 
+@dataclass
+class Http:
+    pool_connections: int
+    pool_maxsize: int
+    connect_timeout_seconds: float
+    read_timeout_seconds: float
+    retries: int
+    backoff_factor: float
+    backoff_jitter: float
+
+    @classmethod
+    def load(cls) -> Http:
+        with open('/app/config/apps.yaml', 'r') as file:
+            config = yaml.safe_load(file).get('http', {})
+        return cls(
+            pool_connections=config.get('pool_connections', 1),
+            pool_maxsize=config.get('pool_maxsize', 10),
+            connect_timeout_seconds=config.get('connect_timeout_seconds', 5),
+            read_timeout_seconds=config.get('read_timeout_seconds', 30),
+            retries=config.get('retries', 0),
+            backoff_factor=config.get('backoff_factor', 0),
+            backoff_jitter=config.get('backoff_jitter', 0)
+        )
+
+
+@dataclass
+class Database:
+    max_pool_size: int
+    min_pool_size: int
+    max_idle_time_ms: int
+    connect_timeout_ms: int
+    server_selection_timeout_ms: int
+    socket_timeout_ms: int
+    compressors: str
+    warm_up: bool
+
+    @classmethod
+    def load(cls) -> Database:
+        with open('/app/config/apps.yaml', 'r') as file:
+            config = yaml.safe_load(file).get('database', {})
+        return cls(
+            max_pool_size=config.get('max_pool_size', 100),
+            min_pool_size=config.get('min_pool_size', 0),
+            max_idle_time_ms=config.get('max_idle_time_ms', 300000),
+            connect_timeout_ms=config.get('connect_timeout_ms', 20000),
+            server_selection_timeout_ms=config.get('server_selection_timeout_ms', 30000),
+            socket_timeout_ms=config.get('socket_timeout_ms', 0),
+            compressors=config.get('compressors', ''),
+            warm_up=config.get('warm_up', False)
+        )
+
+
+@dataclass
+class Notifications:
+    mode: str
+    max_await_ms: int
+    checkpoint_seconds: float
+    retry_seconds: float
+
+    @classmethod
+    def load(cls) -> Notifications:
+        with open('/app/config/apps.yaml', 'r') as file:
+            config = yaml.safe_load(file).get('notifications', {})
+        return cls(
+            mode=config.get('mode', 'http'),
+            max_await_ms=config.get('max_await_ms', 1000),
+            checkpoint_seconds=config.get('checkpoint_seconds', 1),
+            retry_seconds=config.get('retry_seconds', 5)
+        )
+
+
 class Services:
     CLIENT = Service.load('client')
     CONTROLLER = Service.load('controller')
@@ -39,3 +110,10 @@ class Url:
         return url
 
     IMGUR = load_external_url.__func__('imgur')
+
+
+HTTP = Http.load()
+
+DATABASE = Database.load()
+
+NOTIFICATIONS = Notifications.load()
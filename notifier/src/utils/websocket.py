@@ -61,5 +61,13 @@ class Websocket(metaclass=SingletonMeta):
             result = self.connected_users.get(user_id, False)
         return result
 
+    def connected(self, user_ids) -> set:
+        '''
+        Subset of `user_ids` currently connected, checked under one lock.
+        '''
+        with self.users_lock:
+            result = {user_id for user_id in user_ids if self.connected_users.get(user_id, False)}
+        return result
+
     def emit(self, *args, **kwargs) -> None:
         self.app.emit(*args, **kwargs)
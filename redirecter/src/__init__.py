@@ -5,6 +5,8 @@ from flask_restx import Api
 from flask_cors import CORS
 
 from .utils.logger_config import config_logger
+from .utils.apps import DATABASE
+from .database import MongoDBConnect
 
 
 app = Flask(__name__, template_folder="/redirecter/src/templates")
@@ -12,6 +14,9 @@ app = Flask(__name__, template_folder="/redirecter/src/templates")
 CORS(app)
 config_logger(app, DEBUG)
 
+if DATABASE.warm_up:
+    MongoDBConnect.warm_up()
+
 blueprint = Blueprint('api', __name__)
 api = Api(blueprint, version = '1.0.0', title = 'PetBook Redirecter API')
 
@@ -1,21 +1,82 @@
 import os
+import atexit
+import logging
+from threading import Lock
 
 import pymongo
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from ..utils.apps import DATABASE
+
+
+log = logging.getLogger('MONGO')
 
 
 class MongoDBConnect:
+    '''
+    Thin facade over a single pooled `MongoClient` shared by the whole process.
+
+    The client is created lazily on first use and recreated after a fork,
+    so constructing `Queries()` per request is cheap.
+    '''
+
+    _client: MongoClient | None = None
+    _client_pid: int | None = None
+    _client_lock: Lock = Lock()
 
     def __init__(self):
-        self.client = MongoClient(
+        self.client = self.get_client()
+        self.db = self.client[os.environ.get('MONGODB_DATABASE')]
+
+    @classmethod
+    def get_client(cls) -> MongoClient:
+        pid = os.getpid()
+        if cls._client is None or cls._client_pid != pid:
+            with cls._client_lock:
+                if cls._client is None or cls._client_pid != pid:
+                    cls._client = cls._create_client()
+                    cls._client_pid = pid
+        return cls._client
+
+    @staticmethod
+    def _create_client() -> MongoClient:
+        options = {
+            'maxPoolSize': DATABASE.max_pool_size,
+            'minPoolSize': DATABASE.min_pool_size,
+            'maxIdleTimeMS': DATABASE.max_idle_time_ms,
+            'connectTimeoutMS': DATABASE.connect_timeout_ms,
+            'serverSelectionTimeoutMS': DATABASE.server_selection_timeout_ms,
+            'socketTimeoutMS': DATABASE.socket_timeout_ms or None,
+        }
+        if DATABASE.compressors:
+            options['compressors'] = DATABASE.compressors
+
+        log.info(f'Creating MongoDB client for process {os.getpid()} with {options = }')
+        return MongoClient(
             os.environ.get('MONGODB_URI'),
             username=os.environ.get('MONGODB_USER'),
-            password=os.environ.get('MONGODB_PASSWORD')
+            password=os.environ.get('MONGODB_PASSWORD'),
+            **options
         )
-        self.db = self.client[os.environ.get('MONGODB_DATABASE')]
-        
-    def __del__(self):
-        self.client.close()
+
+    @classmethod
+    def warm_up(cls) -> bool:
+        try:
+            cls.get_client().admin.command('ping')
+            log.info('MongoDB client warmed up')
+            return True
+        except PyMongoError as e:
+            log.error(f'Cannot warm up MongoDB client: {e}')
+            return False
+
+    @classmethod
+    def close(cls) -> None:
+        with cls._client_lock:
+            if cls._client is not None and cls._client_pid == os.getpid():
+                cls._client.close()
+            cls._client = None
+            cls._client_pid = None
 
     def get_collection(self, collection_name):
         return self.db[collection_name]
@@ -31,3 +92,6 @@ class MongoDBConnect:
     def find_one(self, collection_name, query={}, projection=None):
         collection = self.get_collection(collection_name)
         return collection.find_one(query, projection)
+
+
+atexit.register(MongoDBConnect.close)